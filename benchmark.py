@@ -0,0 +1,270 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# benchmark.py
+# time the library and query paths of chopitup.py against a synthetic corpus.
+# generates .rec transcripts with a Zipf distributed vocabulary (and a few tiny videos made
+# with ffmpeg for the assemble stage), times each stage, and writes the results as JSON
+# that can be compared between commits with --compare.
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import platform
+import contextlib
+import subprocess
+
+import chopitup
+
+try:
+    import resource
+except ImportError:  # not available on windows
+    resource = None
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+MAX_WORD_DRAWS = 100000  # words drawn looking for segments in the videos before giving up
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def make_vocabulary(size, rng):
+    vocabulary = set()
+    while len(vocabulary) < size:
+        vocabulary.add("".join(rng.choice(LETTERS) for _ in range(rng.randint(1, 10))))
+    return sorted(vocabulary)
+
+
+def zipf_weights(size, exponent):
+    weights = [1.0 / (rank ** exponent) for rank in range(1, size + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    return cumulative
+
+
+def make_video(path, seconds):
+    """
+    Make a tiny test video with a tone, returns False if ffmpeg isn't available.
+    """
+    command = ["ffmpeg", "-y", "-loglevel", "error",
+               "-f", "lavfi", "-i", f"testsrc=size=160x120:rate=25:duration={seconds}",
+               "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+               "-c:v", "libx264", "-c:a", "aac", "-shortest", path]
+    try:
+        return subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE).returncode == 0
+    except OSError:
+        return False
+
+
+def make_corpus(corpus_dir, sources, words_per_source, vocabulary, cumulative, rng, video_seconds=0):
+    """
+    Write one .rec per source, words are spaced 0.4s apart. With video_seconds each source also
+    gets a real video of that length (the transcript times wrap around it).
+    """
+    videos = []
+    for src in range(sources):
+        media = os.path.join(corpus_dir, f"source_{src:05d}.mp4")
+        if video_seconds and src < 4:
+            if make_video(media, video_seconds):
+                videos.append(media)
+
+        words = rng.choices(vocabulary, cum_weights=cumulative, k=words_per_source)
+        lines = [f"media={media}\n"]
+        for idx, word in enumerate(words):
+            start = (idx * 0.4) % video_seconds if video_seconds else idx * 0.4
+            lines.append(f"{word}\t{start:.2f}\t{start + 0.3:.2f}\n")
+        with open(os.path.join(corpus_dir, f"source_{src:05d}.rec"), "w") as f:
+            f.writelines(lines)
+    return videos
+
+
+class Benchmark:
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, count=None):
+        """
+        Time a stage with its output suppressed, count is the number of operations in it.
+        """
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            yield
+            seconds = time.perf_counter() - start
+
+        result = {"seconds": round(seconds, 6), "peak_rss_mb": peak_rss_mb()}
+        if count:
+            result["count"] = count
+            result["per_op_ms"] = round(1000.0 * seconds / count, 4)
+        self.stages[name] = result
+        per_op = f" ({result['per_op_ms']:.3f} ms/op)" if count else ""
+        print(f"{name:<28} {seconds:10.4f}s{per_op}  peak rss {result['peak_rss_mb']} MB")
+
+
+def git_commit():
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        return result.stdout.decode().strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    rng = random.Random(args.seed)
+    vocabulary = make_vocabulary(args.vocabulary, rng)
+    cumulative = zipf_weights(len(vocabulary), args.zipf)
+    bench = Benchmark()
+
+    work_dir = tempfile.mkdtemp(prefix="chopitup_bench_")
+    try:
+        corpus_dir = os.path.join(work_dir, "corpus")
+        os.makedirs(corpus_dir)
+        print(f"Generating corpus: {args.sources} sources x {args.words} words, vocabulary {len(vocabulary)}")
+        videos = make_corpus(corpus_dir, args.sources, args.words, vocabulary, cumulative, rng,
+                             video_seconds=0 if args.no_video else 10)
+
+        library_path = os.path.join(work_dir, "bench_library" + chopitup.LIBRARY_FORMATS[args.format])
+
+        library = chopitup.WordSegmentLibrary(library_path)
+        with bench.stage("librarian"):
+            library.librarian(corpus_dir)
+        with bench.stage("librarian (unchanged)"):
+            library.librarian(corpus_dir)
+
+        library = chopitup.WordSegmentLibrary(library_path)
+        with bench.stage("load_word_library"):
+            library.load_word_library()
+
+        sentences = [" ".join(rng.choices(vocabulary, cum_weights=cumulative, k=args.sentence_length)) for _ in range(args.queries)]
+        # misspell a word in each sentence so check_string has to look for alternatives
+        misspelled = []
+        for sentence in sentences:
+            words = sentence.split()
+            words[0] = words[0] + rng.choice(LETTERS)
+            misspelled.append(" ".join(words))
+        word_lists = [", ".join(rng.sample(vocabulary[:200], 3)) for _ in range(args.queries)]
+
+        with bench.stage("creator", args.queries):
+            for sentence in sentences:
+                library.creator(sentence)
+        with bench.stage("creator_from_words_list", args.queries):
+            for word_list in word_lists:
+                library.creator_from_words_list(word_list)
+        with bench.stage("check_string (cold)", args.queries):
+            for sentence in misspelled:
+                library.check_string(sentence)
+        with bench.stage("check_string (warm)", args.queries):
+            for sentence in misspelled:
+                library.check_string(sentence)
+        with bench.stage("library_stats"):
+            library.library_stats()
+        with bench.stage("library_stats (word)", args.queries):
+            for sentence in sentences:
+                library.library_stats(sentence.split()[0])
+
+        if videos and args.segments:
+            sources = library.word_library["sources"]
+            video_srcs = [sources.index(video) for video in videos]
+            segments = []
+            # bounded, in case hardly any (or none) of the words occur in the videos
+            for _ in range(MAX_WORD_DRAWS):
+                if len(segments) >= args.segments:
+                    break
+                word = rng.choices(vocabulary, cum_weights=cumulative)[0]
+                segments.extend(o for o in library.get_word_occurrences(word) if o["src"] in video_srcs)
+            segments = segments[:args.segments]
+            if not segments:
+                print("No words of the vocabulary occur in the test videos, skipping assemble_video")
+            else:
+                output = os.path.join(work_dir, "bench_output.mp4")
+                with bench.stage("assemble_video", len(segments)):
+                    chopitup.assemble_video(library, segments, output)
+        elif args.segments and not args.no_video:
+            print("ffmpeg not available, skipping assemble_video")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "sources": args.sources,
+            "words": args.words,
+            "vocabulary": args.vocabulary,
+            "zipf": args.zipf,
+            "queries": args.queries,
+            "sentence_length": args.sentence_length,
+            "segments": args.segments,
+            "format": args.format,
+            "seed": args.seed,
+        },
+        "stages": bench.stages,
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Print stage timings against a baseline run, returns True if any stage got slower by more than threshold.
+    """
+    if results["params"] != baseline["params"]:
+        print("Warning: baseline was run with different parameters")
+
+    regressed = False
+    print(f"\n{'stage':<28} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        before = baseline["stages"][name]["seconds"]
+        after = result["seconds"]
+        change = (after - before) / before if before > 0 else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressed = True
+        print(f"{name:<28} {before:10.4f} {after:10.4f} {100 * change:+7.1f}%{flag}")
+    return regressed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ChopItUp benchmark on a synthetic corpus")
+    parser.add_argument("--sources", metavar="N", type=int, default=200, help="Number of synthetic .rec sources (default: 200)")
+    parser.add_argument("--words", metavar="N", type=int, default=2000, help="Words per source (default: 2000)")
+    parser.add_argument("--vocabulary", metavar="N", type=int, default=20000, help="Vocabulary size (default: 20000)")
+    parser.add_argument("--zipf", metavar="S", type=float, default=1.1, help="Zipf exponent of the word distribution (default: 1.1)")
+    parser.add_argument("--queries", metavar="N", type=int, default=200, help="Queries per query stage (default: 200)")
+    parser.add_argument("--sentence-length", metavar="N", type=int, default=8, help="Words per query sentence (default: 8)")
+    parser.add_argument("--segments", metavar="N", type=int, default=20, help="Segments for the assemble_video stage, 0 to skip (default: 20)")
+    parser.add_argument("--no-video", action="store_true", help="Don't generate videos, skips assemble_video")
+    parser.add_argument("--format", choices=sorted(chopitup.LIBRARY_FORMATS), default="json", help="Library format to benchmark (default: json)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    parser.add_argument("--output", metavar="FILE", help="Write the results as JSON to FILE")
+    parser.add_argument("--compare", metavar="FILE", help="Compare against the JSON results of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Slowdown that counts as a regression for --compare (default: 0.2)")
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,193 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# binary_library.py
+# compact, memory-mapped alternative to the JSON word library.
+#
+# file layout (little endian, sections 8 byte aligned):
+#   header   magic "CIUL", version, word count, occurrence count, then the offsets
+#            of each section below
+#   meta     JSON of the bookkeeping keys ("sources", "manifest", ...)
+#   vocab    one (string offset, string length, first occurrence, count) uint32 entry per word,
+#            sorted by the utf-8 bytes of the word so lookups are a binary search
+#   strings  utf-8 encoded words
+#   src      uint32 per occurrence
+#   A, B     float32 per occurrence
+#   P        uint32 per occurrence, the word's position in its source (version 2 and up),
+#            NO_POSITION for occurrences from libraries built before positions were recorded
+# the occurrences of a word are contiguous in the src/A/B/P columns, so a lookup only touches
+# the vocab entries on its search path and the pages holding that word's occurrences.
+
+import os
+import json
+import mmap
+import shutil
+import struct
+import tempfile
+from collections.abc import Mapping
+
+MAGIC = b"CIUL"
+VERSION = 2
+NO_POSITION = 0xFFFFFFFF
+
+PREAMBLE = struct.Struct("<4sI")
+HEADERS = {
+    1: struct.Struct("<4sIII7Q"),
+    2: struct.Struct("<4sIII8Q"),
+}
+HEADER = HEADERS[VERSION]
+VOCAB_ENTRY = struct.Struct("<IIII")
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+class BinaryWordLibrary(Mapping):
+    """
+    Read-only, dict-like view of a binary word library. Behaves like the loaded JSON library:
+    the bookkeeping keys return their values and each word returns a list of
+    {"src", "A", "B", "P"} occurrence dicts, built on demand from the mmapped columns.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version = PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC or version not in HEADERS:
+            self._mm.close()
+            raise ValueError(f"{path} is not a binary word library (version {VERSION})")
+
+        header = HEADERS[version].unpack_from(self._mm, 0)
+        (self.word_count, self.occurrence_count, meta_offset, meta_length, self._vocab_offset,
+         self._strings_offset, self._src_offset, self._a_offset, self._b_offset) = header[2:11]
+        self._p_offset = header[11] if version >= 2 else None
+
+        self.meta = json.loads(self._mm[meta_offset:meta_offset + meta_length].decode("utf-8"))
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _entry(self, idx):
+        return VOCAB_ENTRY.unpack_from(self._mm, self._vocab_offset + idx * VOCAB_ENTRY.size)
+
+    def _word_bytes(self, entry):
+        start = self._strings_offset + entry[0]
+        return self._mm[start:start + entry[1]]
+
+    def _find(self, word):
+        """
+        Binary search the vocab table, returns the entry for word or None.
+        """
+        key = word.encode("utf-8")
+        lo, hi = 0, self.word_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry = self._entry(mid)
+            found = self._word_bytes(entry)
+            if found < key:
+                lo = mid + 1
+            elif found > key:
+                hi = mid
+            else:
+                return entry
+        return None
+
+    def __getitem__(self, key):
+        if key in self.meta:
+            return self.meta[key]
+
+        entry = self._find(key)
+        if entry is None:
+            raise KeyError(key)
+
+        _, _, first, count = entry
+        srcs = struct.unpack_from(f"<{count}I", self._mm, self._src_offset + 4 * first)
+        starts = struct.unpack_from(f"<{count}f", self._mm, self._a_offset + 4 * first)
+        ends = struct.unpack_from(f"<{count}f", self._mm, self._b_offset + 4 * first)
+
+        # .rec timestamps have 2 decimals, rounding gets the original values back from float32
+        occurrences = [{"src": src, "A": round(a, 2), "B": round(b, 2)} for src, a, b in zip(srcs, starts, ends)]
+
+        if self._p_offset is not None:
+            positions = struct.unpack_from(f"<{count}I", self._mm, self._p_offset + 4 * first)
+            for occurrence, position in zip(occurrences, positions):
+                if position != NO_POSITION:
+                    occurrence["P"] = position
+
+        return occurrences
+
+    def __contains__(self, key):
+        return key in self.meta or self._find(key) is not None
+
+    def __iter__(self):
+        yield from self.meta
+        for idx in range(self.word_count):
+            yield self._word_bytes(self._entry(idx)).decode("utf-8")
+
+    def __len__(self):
+        return len(self.meta) + self.word_count
+
+
+def write_binary_library(path, word_library, reserved_keys):
+    """
+    Write a dict-like word library (as loaded from JSON) to path in the binary format.
+    """
+    meta = {key: word_library[key] for key in reserved_keys if key in word_library}
+    words = sorted((key for key in word_library if key not in reserved_keys), key=lambda w: w.encode("utf-8"))
+    write_binary_library_stream(path, meta, ((word, word_library[word]) for word in words))
+
+
+def write_binary_library_stream(path, meta, words):
+    """
+    Write a binary library from the meta dict and an iterable of (word, occurrences) pairs sorted
+    by the utf-8 bytes of the word. The sections are spooled to temporary files as the words
+    come in, so only one word's occurrences are held in memory.
+    The file is written to a temporary name and renamed into place.
+    """
+    meta_bytes = json.dumps(meta).encode("utf-8")
+    # vocab, strings, src, A, B, P
+    sections = [tempfile.TemporaryFile() for _ in range(6)]
+    vocab, strings, srcs, starts, ends, positions = sections
+    word_count = occurrence_count = strings_length = 0
+
+    try:
+        for word, occurrences in words:
+            word_bytes = word.encode("utf-8")
+            count = len(occurrences)
+            vocab.write(VOCAB_ENTRY.pack(strings_length, len(word_bytes), occurrence_count, count))
+            strings.write(word_bytes)
+            srcs.write(struct.pack(f"<{count}I", *(occurrence["src"] for occurrence in occurrences)))
+            starts.write(struct.pack(f"<{count}f", *(occurrence["A"] for occurrence in occurrences)))
+            ends.write(struct.pack(f"<{count}f", *(occurrence["B"] for occurrence in occurrences)))
+            positions.write(struct.pack(f"<{count}I", *(occurrence.get("P", NO_POSITION) for occurrence in occurrences)))
+            word_count += 1
+            occurrence_count += count
+            strings_length += len(word_bytes)
+
+        meta_offset = _align(HEADER.size)
+        vocab_offset = _align(meta_offset + len(meta_bytes))
+        strings_offset = _align(vocab_offset + word_count * VOCAB_ENTRY.size)
+        src_offset = _align(strings_offset + strings_length)
+        a_offset = _align(src_offset + 4 * occurrence_count)
+        b_offset = _align(a_offset + 4 * occurrence_count)
+        p_offset = _align(b_offset + 4 * occurrence_count)
+
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, word_count, occurrence_count,
+                                meta_offset, len(meta_bytes), vocab_offset, strings_offset,
+                                src_offset, a_offset, b_offset, p_offset))
+            f.write(b"\0" * (meta_offset - f.tell()))
+            f.write(meta_bytes)
+            for offset, section in zip((vocab_offset, strings_offset, src_offset, a_offset, b_offset, p_offset), sections):
+                f.write(b"\0" * (offset - f.tell()))
+                section.seek(0)
+                shutil.copyfileobj(section, f)
+    finally:
+        for section in sections:
+            section.close()
+
+    os.replace(temp_path, path)
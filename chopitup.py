@@ -2,13 +2,52 @@
 # see the README.md
 
 import os
+import sys
 import glob
+import hmac
 import json
+import mmap
+import time
+import wave
+import array
+import heapq
+import bisect
+import hashlib
 import argparse
-from collections import Counter
-from moviepy.editor import VideoFileClip, concatenate_videoclips
+import ipaddress
+import contextlib
+import shutil
+import socket
+import tempfile
+import subprocess
+import threading
+import urllib.error
+import urllib.request
+import multiprocessing
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import appdirs
 from difflib import SequenceMatcher
+from binary_library import BinaryWordLibrary, write_binary_library, write_binary_library_stream
+from sqlite_library import SqliteWordLibrary, write_sqlite_library
+import profiling
+
+try:
+    import numpy  # optional, vectorizes the audio previews
+except ImportError:
+    numpy = None
+
+try:
+    import inotify_simple  # optional, --watch polls the directory without it
+except ImportError:
+    inotify_simple = None
+
+try:
+    import fcntl  # locks the segment cache between processes, not available on windows
+except ImportError:
+    fcntl = None
 
 app_name = "ChopItUp"
 word_library_path = "words_library.json"
@@ -17,70 +56,720 @@ os.makedirs(data_dir, exist_ok=True)
 
 verbose = False # set to True to print debug messages
 
+# keys in the library that hold bookkeeping rather than words
+RESERVED_KEYS = ("sources", "manifest", "version")
+
+# a word that is also a bookkeeping key is stored under WORD_ESCAPE + word, and so is any word
+# starting with WORD_ESCAPE, so a transcript can't overwrite the bookkeeping and keys map back to words
+WORD_ESCAPE = "="
+
+# version 2 records each word's position in its source ("P") for phrase lookups,
+# version 3 numbers the positions on across all the .rec files of a source
+LIBRARY_VERSION = 3
+
+# on-disk library formats, selected with --format
+LIBRARY_FORMATS = {"json": ".json", "bin": ".bin", "sqlite": ".sqlite"}
+
+
+def word_key(word):
+    """
+    The library key a word is stored under.
+    """
+    return WORD_ESCAPE + word if word in RESERVED_KEYS or word.startswith(WORD_ESCAPE) else word
+
+
+def key_word(key):
+    """
+    The word stored under a library key (other than RESERVED_KEYS), the inverse of word_key().
+    """
+    return key[len(WORD_ESCAPE):] if key.startswith(WORD_ESCAPE) else key
+
+
+def library_path(label, library_format="json"):
+    """
+    Path of the library for a label in the given format.
+    """
+    name = f"{label}_library" if label else "word_library"
+    return os.path.join(data_dir, name + LIBRARY_FORMATS[library_format])
+
+
+def is_multi_label(label):
+    """
+    True if --label names several libraries: a comma separated list and/or glob patterns.
+    """
+    return label is not None and any(c in label for c in ",*?[")
+
+
+def library_paths(label, library_format="json"):
+    """
+    Paths of the existing libraries matched by a multi-label --label, in the order given,
+    glob patterns are matched against the libraries in data_dir.
+    """
+    suffix = "_library" + LIBRARY_FORMATS[library_format]
+    paths = []
+    for part in label.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if any(c in part for c in "*?["):
+            matches = sorted(glob.glob(os.path.join(data_dir, part + suffix)))
+        else:
+            matches = [library_path(part, library_format)]
+        for path in matches:
+            if not os.path.exists(path):
+                print(f"No library for label '{part}': {path}")
+            elif path not in paths:
+                paths.append(path)
+    return paths
+
+
+def read_library(path):
+    """
+    Read a library file of either format into a plain dict.
+    """
+    if path.endswith(LIBRARY_FORMATS["bin"]) or path.endswith(LIBRARY_FORMATS["sqlite"]):
+        opened = BinaryWordLibrary(path) if path.endswith(LIBRARY_FORMATS["bin"]) else SqliteWordLibrary(path)
+        word_library = {key: opened[key] for key in opened}
+        opened.close()
+        return word_library
+
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_library(path, word_library):
+    """
+    Write a dict library to path, the format follows the file extension.
+    """
+    if path.endswith(LIBRARY_FORMATS["bin"]):
+        write_binary_library(path, word_library, RESERVED_KEYS)
+    elif path.endswith(LIBRARY_FORMATS["sqlite"]):
+        # rebuilt in place in one transaction, renaming a new file over the database could leave
+        # its -wal/-shm files from open readers to be replayed against the wrong file
+        write_sqlite_library(path, word_library, RESERVED_KEYS)
+    else:
+        # write and rename so readers (e.g. --serve) never see a half written library
+        with open(path + ".tmp", "w") as f:
+            json.dump(word_library, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+def write_library_stream(path, meta, words):
+    """
+    Write a JSON or binary library from the bookkeeping keys in meta and an iterable of
+    (word, occurrences) sorted by word, without holding the whole library in memory.
+    The JSON is laid out like write_library's.
+    """
+    if path.endswith(LIBRARY_FORMATS["bin"]):
+        write_binary_library_stream(path, meta, words)
+        return
+
+    with open(path + ".tmp", "w") as f:
+        f.write("{")
+        separator = "\n"
+        for items in (meta.items(), words):
+            for key, value in items:
+                # the entry as json.dump(indent=2) of the whole library would lay it out
+                f.write(separator + json.dumps({key: value}, indent=2)[2:-2])
+                separator = ",\n"
+        f.write("\n}" if separator != "\n" else "}")
+    os.replace(path + ".tmp", path)
+
+
+def convert_library(source_path, destination_path):
+    """
+    Convert a library between the JSON and binary formats.
+    """
+    write_library(destination_path, read_library(source_path))
+    print(f"Converted {source_path} to {destination_path}")
+
+
+def file_hash(path):
+    """
+    Return the sha1 hex digest of a file's contents.
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_rec_file(rec_file):
+    """
+    Parse a .rec transcript, returns (source_media, [(word, start_time, end_time), ...]).
+    """
+    words = []
+    with open(rec_file, "r") as f:
+        first_line = f.readline().strip()
+        source_media = first_line.replace("media=", "")
+
+        for line in f:
+            # lines starting with # are markers (e.g. "# complete") rather than words
+            if line.startswith("#") or not line.strip():
+                continue
+            word, start_time, end_time = line.strip().split('\t')
+            words.append((word.lower(), float(start_time), float(end_time)))
+
+    return source_media, words
+
+
+# ------------------------------
+# streaming ingest for building a library from many .rec files: worker processes parse batches
+# of files into sorted runs of "word, file, position, A, B" lines, the runs are k-way merged
+# (in rounds of MERGE_FANIN) and the merged stream is written a word at a time, so memory use
+# depends on the batch size and the most frequent word rather than on the corpus size.
+
+STREAM_BATCH_FILES = 64
+MERGE_FANIN = 64
+
+
+def parse_rec_batch(task):
+    """
+    Streaming ingest worker: task is (index of the first file, rec files, run path).
+    Each file is read once for both its hash and its words. Returns a (manifest entry, media,
+    word count) tuple per file.
+    """
+    first, rec_files, run_path = task
+    lines = []
+    files = []
+    for file_idx, rec_file in enumerate(rec_files, first):
+        stat = os.stat(rec_file)
+        with open(rec_file, "rb") as f:
+            data = f.read()
+        first_line, _, body = data.decode("utf-8").partition("\n")
+        position = 0
+        for line in body.split("\n"):
+            # lines starting with # are markers (e.g. "# complete") rather than words
+            if line.startswith("#") or not line.strip():
+                continue
+            word, start_time, end_time = line.strip().split("\t")
+            # library keys rather than words, so a word can't clash with the bookkeeping keys written
+            # ahead of the words, and fixed width numbers so the lines sort by key, then file, then position
+            lines.append(f"{word_key(word.lower())}\t{file_idx:010d}\t{position:010d}\t{float(start_time)!r}\t{float(end_time)!r}\n")
+            position += 1
+        files.append(({"size": stat.st_size, "mtime": stat.st_mtime, "hash": hashlib.sha1(data).hexdigest()},
+                      first_line.strip().replace("media=", ""), position))
+
+    lines.sort()
+    with open(run_path, "w") as f:
+        f.writelines(lines)
+    return files
+
+
+def merge_runs(task):
+    """
+    Merge sorted run files into one, task is (run paths, output path). The inputs are removed.
+    """
+    run_paths, output_path = task
+    runs = [open(run_path, "r") for run_path in run_paths]
+    try:
+        with open(output_path, "w") as f:
+            f.writelines(heapq.merge(*runs))
+    finally:
+        for run in runs:
+            run.close()
+    for run_path in run_paths:
+        os.remove(run_path)
+
+
+def merged_occurrences(run_paths, file_srcs, file_positions):
+    """
+    Yield (word, occurrences) from the k-way merge of the runs, in word order.
+    file_positions holds the position each file's words are numbered from in its source.
+    """
+    runs = [open(run_path, "r") for run_path in run_paths]
+    try:
+        word, occurrences = None, []
+        for line in heapq.merge(*runs):
+            line_word, file_idx, position, start_time, end_time = line[:-1].split("\t")
+            if line_word != word:
+                if occurrences:
+                    yield word, occurrences
+                word, occurrences = line_word, []
+            file_idx = int(file_idx)
+            occurrences.append({"src": file_srcs[file_idx], "A": float(start_time), "B": float(end_time),
+                                "P": file_positions[file_idx] + int(position)})
+        if occurrences:
+            yield word, occurrences
+    finally:
+        for run in runs:
+            run.close()
+
+
+def plan_rec_updates(manifest, rec_files):
+    """
+    Compare .rec files on disk against the library manifest.
+    Returns (changed, deleted): changed is a list of (rec_file, manifest_entry) for new or
+    modified files, deleted lists manifest paths that no longer exist on disk.
+    Files whose size and mtime match the manifest are skipped without hashing.
+    """
+    changed = []
+    for rec_file in rec_files:
+        stat = os.stat(rec_file)
+        entry = manifest.get(rec_file)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            continue
+
+        content_hash = file_hash(rec_file)
+        if entry and entry["hash"] == content_hash:
+            # touched but not modified
+            entry["size"] = stat.st_size
+            entry["mtime"] = stat.st_mtime
+            continue
+
+        changed.append((rec_file, {"size": stat.st_size, "mtime": stat.st_mtime, "hash": content_hash}))
+
+    deleted = [rec_file for rec_file in manifest if not os.path.exists(rec_file)]
+    return changed, deleted
+
+
+class FuzzyWordIndex:
+    """
+    Similarity index over the library vocabulary used by get_alternative_word().
+    Words are bucketed by first letter and length, so a lookup only looks at the candidates
+    get_alternative_word() would accept (same first letter, length within 2). Within a bucket
+    a character inverted index gives each candidate an upper bound on its similarity, and
+    candidates are scored best bound first until none left can win.
+    The buckets are saved next to the library and updated with the vocabulary difference
+    when the library file changes, the character postings are built per bucket on first use.
+    """
+    VERSION = 1
+    MAX_LENGTH_DIFFERENCE = 2
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.signature = None
+        self.words = []     # vocabulary in library order, removed words are None
+        self.buckets = {}   # "first letter:length" -> indices into words
+        self.postings = {}  # bucket key -> {(char, nth occurrence of char): indices}
+        self.cache = {}
+
+    @staticmethod
+    def bucket_key(word):
+        return f"{word[0]}:{len(word)}"
+
+    @staticmethod
+    def library_signature(word_library_path):
+        if word_library_path and os.path.exists(word_library_path):
+            stat = os.stat(word_library_path)
+            signature = [stat.st_size, stat.st_mtime_ns]
+            # sqlite libraries in WAL mode change the -wal file long before the database file
+            if os.path.exists(word_library_path + "-wal"):
+                stat = os.stat(word_library_path + "-wal")
+                signature += [stat.st_size, stat.st_mtime_ns]
+            return signature
+        return None
+
+    def load(self):
+        if not self.index_path or not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            return
+        if data.get("version") == self.VERSION:
+            self.signature = data["signature"]
+            self.words = data["words"]
+            self.buckets = data["buckets"]
+
+    def save(self):
+        if not self.index_path:
+            return
+        with open(self.index_path, "w") as f:
+            json.dump({"version": self.VERSION, "signature": self.signature,
+                       "words": self.words, "buckets": self.buckets}, f)
+
+    def add(self, word):
+        self.buckets.setdefault(self.bucket_key(word), []).append(len(self.words))
+        self.words.append(word)
+
+    def update(self, word_library, signature):
+        """
+        Bring the index in line with the library vocabulary, returns True if anything changed.
+        """
+        if signature is not None and signature == self.signature:
+            return False
+
+        current = [key_word(key) for key in word_library if key not in RESERVED_KEYS and key]
+        known = {word: idx for idx, word in enumerate(self.words) if word is not None}
+        current_set = set(current)
+
+        removed = [word for word in known if word not in current_set]
+        if len(removed) > len(current) // 2:
+            # mostly a different vocabulary, start again
+            self.words, self.buckets, known, removed = [], {}, {}, []
+
+        for word in removed:
+            idx = known.pop(word)
+            self.words[idx] = None
+            self.buckets[self.bucket_key(word)].remove(idx)
+
+        for word in current:
+            if word not in known:
+                self.add(word)
+
+        self.signature = signature
+        self.postings = {}
+        self.cache = {}
+        return True
+
+    def bucket_postings(self, key):
+        postings = self.postings.get(key)
+        if postings is None:
+            postings = {}
+            for idx in self.buckets.get(key, []):
+                seen = {}
+                for char in self.words[idx]:
+                    nth = seen[char] = seen.get(char, 0) + 1
+                    postings.setdefault((char, nth), []).append(idx)
+            self.postings[key] = postings
+        return postings
+
+    def best_matches(self, word, k=1):
+        """
+        Return up to k (word, similarity) pairs ranked by similarity, ties going to the word
+        that comes first in the library. With k=1 this is exactly the word the original
+        full vocabulary scan picked.
+        """
+        cache_key = (word, k)
+        if cache_key in self.cache:
+            return self.cache[cache_key]
+
+        # upper bound for each candidate from the number of characters it shares with word
+        # (what quick_ratio() computes), worked out the same way as ratio() so equal values
+        # compare equal. Candidates sharing no characters can't score above 0 and never show up.
+        char_counts = [(char, word.count(char)) for char in set(word)]
+        bounded = []
+        for length in range(len(word) - self.MAX_LENGTH_DIFFERENCE, len(word) + self.MAX_LENGTH_DIFFERENCE + 1):
+            postings = self.bucket_postings(f"{word[0]}:{length}")
+            if not postings:
+                continue
+            shared = Counter()
+            for char, count in char_counts:
+                for nth in range(1, count + 1):
+                    shared.update(postings.get((char, nth), ()))
+            total_length = len(word) + length
+            bounded.extend((-2.0 * matches / total_length, idx) for idx, matches in shared.items())
+        bounded.sort()
+
+        # score the most promising candidates first, stop once no candidate left can make the list
+        matcher = SequenceMatcher(None, word, "")
+        ranked = []  # sorted best first as (-similarity, index)
+        for negative_bound, idx in bounded:
+            if len(ranked) == k and (negative_bound, idx) > ranked[-1]:
+                break
+            matcher.set_seq2(self.words[idx])
+            similarity = matcher.ratio()
+            if similarity <= 0:
+                continue
+            ranked.append((-similarity, idx))
+            ranked.sort()
+            del ranked[k:]
+
+        matches = [(self.words[idx], -negative_similarity) for negative_similarity, idx in ranked]
+        self.cache[cache_key] = matches
+        return matches
+
+
+class LibraryStats:
+    """
+    Word statistics kept next to the library (<library>.stats) so --stats doesn't have to load
+    and walk the whole library: per-word occurrence counts, duration sums and duration
+    histograms, and word counts per source. librarian() updates them with the occurrences it
+    removes and adds, the summary (totals and top lists) is worked out once when they are saved.
+    """
+    VERSION = 1
+    TOP = 20
+    DURATION_BINS = (0.1, 0.2, 0.3, 0.5, 1.0)  # bucket upper edges in seconds, the last bucket takes the rest
+
+    def __init__(self, stats_path=None):
+        self.stats_path = stats_path
+        self.signature = None
+        self.words = {}    # word -> [count, duration sum, count per duration bucket...]
+        self.sources = {}  # source media -> word count
+        self.summary = None
+
+    @classmethod
+    def from_library(cls, word_library, stats_path=None):
+        """
+        Build the statistics by walking every occurrence in a library.
+        """
+        stats = cls(stats_path)
+        sources = word_library["sources"]
+        for key in word_library:
+            if key not in RESERVED_KEYS:
+                for occurrence in word_library[key]:
+                    stats.add(key_word(key), sources[occurrence["src"]], occurrence["A"], occurrence["B"])
+        return stats
+
+    def load(self):
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, "r") as f:
+                data = json.load(f)
+        except ValueError:
+            return
+        if data.get("version") == self.VERSION:
+            self.signature = data["signature"]
+            self.words = data["words"]
+            self.sources = data["sources"]
+            self.summary = data["summary"]
+
+    def save(self):
+        if not self.stats_path:
+            return
+        with open(self.stats_path + ".tmp", "w") as f:
+            json.dump({"version": self.VERSION, "signature": self.signature, "summary": self.get_summary(),
+                       "words": self.words, "sources": self.sources}, f)
+        os.replace(self.stats_path + ".tmp", self.stats_path)
+
+    def add(self, word, media, start_time, end_time, sign=1):
+        """
+        Count an occurrence in, or out with sign=-1.
+        """
+        entry = self.words.get(word)
+        if entry is None:
+            entry = self.words[word] = [0, 0.0] + [0] * (len(self.DURATION_BINS) + 1)
+        duration = end_time - start_time
+        entry[0] += sign
+        entry[1] += sign * duration
+        entry[2 + bisect.bisect_left(self.DURATION_BINS, duration)] += sign
+        if entry[0] <= 0:
+            del self.words[word]
+
+        count = self.sources.get(media, 0) + sign
+        if count > 0:
+            self.sources[media] = count
+        else:
+            self.sources.pop(media, None)
+        self.summary = None
+
+    def add_words(self, media, words, sign=1):
+        """
+        Count in (or out) the [(word, start_time, end_time), ...] of a source.
+        """
+        for word, start_time, end_time in words:
+            self.add(word, media, start_time, end_time, sign)
+
+    def merge(self, other):
+        for word, entry in other.words.items():
+            mine = self.words.get(word)
+            self.words[word] = list(entry) if mine is None else [a + b for a, b in zip(mine, entry)]
+        for media, count in other.sources.items():
+            self.sources[media] = self.sources.get(media, 0) + count
+        self.summary = None
+
+    def get_summary(self):
+        """
+        Totals, top lists and the duration histogram of the whole library, as a dict.
+        """
+        if self.summary is None:
+            histogram = [0] * (len(self.DURATION_BINS) + 1)
+            for entry in self.words.values():
+                for idx, count in enumerate(entry[2:]):
+                    histogram[idx] += count
+
+            # nlargest keeps library order between equal values, like Counter.most_common()
+            top_words = heapq.nlargest(self.TOP, self.words.items(), key=lambda item: item[1][0])
+            longest_words = heapq.nlargest(self.TOP, self.words, key=len)
+            self.summary = {
+                "total_words": sum(entry[0] for entry in self.words.values()),
+                "unique_words": len(self.words),
+                "top_words": [(word, entry[0]) for word, entry in top_words],
+                "longest_words": [(word, len(word)) for word in longest_words],
+                "duration_total": round(sum(entry[1] for entry in self.words.values()), 2),
+                "duration_bins": list(self.DURATION_BINS),
+                "duration_histogram": histogram,
+                "sources": sorted(self.sources.items(), key=lambda item: item[1], reverse=True),
+            }
+        return self.summary
+
+    def word_stats(self, word):
+        entry = self.words.get(word)
+        if entry is None:
+            return {"word": word, "found": False}
+        return {
+            "word": word,
+            "found": True,
+            "occurrences": entry[0],
+            "duration_total": round(entry[1], 2),
+            "duration_mean": round(entry[1] / entry[0], 3),
+            "duration_bins": list(self.DURATION_BINS),
+            "duration_histogram": entry[2:],
+        }
+
 
 class WordSegmentLibrary:
+    # cost model for plan_segments(), in rough units of "one extra cut"
+    CUT_COST = 1.0              # every separate segment in the output
+    SOURCE_OPEN_COST = 10.0     # opening and probing another source file
+    SOURCE_SWITCH_COST = 1.0    # jumping to a source that is already open
+    SEEK_COST_PER_MINUTE = 0.5  # seeking forward within a source
+    BACKWARD_SEEK_COST = 2.0    # seeking backwards restarts the reader
+    PLAN_BEAM_WIDTH = 64
+    PLAN_MAX_CANDIDATES = 200   # occurrences considered per word
+    PHRASE_MAX_GAP = 1.0        # seconds of silence that end a run of consecutive words
+
     def __init__(self, word_library_path):
         self.word_library_path = word_library_path
         self.word_library = None
+        self.fuzzy_index = None
+        self.stats = None
 
     def load_word_library(self):
         """
-        Load the word library from the JSON file specified by word_library_path.
+        Load the word library from the file specified by word_library_path.
+        JSON libraries are loaded into memory, binary libraries are memory-mapped,
+        SQLite libraries are queried as needed.
         """
         if os.path.exists(self.word_library_path):
-            with open(self.word_library_path, "r") as f:
-                self.word_library = json.load(f)
+            with profiling.span("library.load", path=self.word_library_path):
+                if self.word_library_path.endswith(LIBRARY_FORMATS["bin"]):
+                    self.word_library = BinaryWordLibrary(self.word_library_path)
+                elif self.word_library_path.endswith(LIBRARY_FORMATS["sqlite"]):
+                    self.word_library = SqliteWordLibrary(self.word_library_path)
+                else:
+                    with open(self.word_library_path, "r") as f:
+                        self.word_library = json.load(f)
         else:
             # create an empty library
             self.word_library = {"sources": []}            
 
-    def librarian(self, rec_files_path="."):
+    def librarian(self, rec_files_path=".", rec_files=None, jobs=1):
         """
         Generate the word library from the .rec files in the specified directory
-        and save it as a JSON file.
+        and save it in the library's format.
+        The library keeps a manifest of ingested .rec files (path, size, mtime, hash) so only
+        new or changed files are parsed, and occurrences from changed or deleted files are replaced.
+        With rec_files only those files are merged, the rest of the library is left as it is.
+        A new JSON or binary library is built by librarian_streaming() when jobs > 1.
         """
+        if self.word_library_path.endswith(LIBRARY_FORMATS["sqlite"]):
+            self.librarian_sqlite(rec_files_path, rec_files)
+            return
+
+        if jobs > 1 and rec_files is None and not os.path.exists(self.word_library_path):
+            self.librarian_streaming(rec_files_path, jobs)
+            return
+
         available = False
 
         # if it already exists, load it and update it...
         if os.path.exists(self.word_library_path):
-            with open(self.word_library_path, "r") as f:
-                word_library = json.load(f)
-                available = True
+            word_library = read_library(self.word_library_path)
+            available = True
         else:
             word_library = {"sources": []}
 
-        # look for .rec files in the specified directory
-        rec_files = glob.glob(os.path.join(rec_files_path, "*.rec"))
         sources = word_library["sources"]
-        for rec_file in rec_files:
-            with open(rec_file, "r") as f:
-                first_line = f.readline().strip()
-                source_media = first_line.replace("media=", "")
-
-                if source_media not in sources:
-                    sources.append(source_media) # add the source to the library
-
-        for rec_file in rec_files:
-            with open(rec_file, "r") as f:
-                first_line = f.readline().strip()
-                source_media = first_line.replace("media=", "")
-
-                for line in f:
-                    word, start_time, end_time = line.strip().split('\t')
-                    word = word.lower()
-                    word_data = {
-                        "src": sources.index(source_media),
-                        "A": float(start_time),
-                        "B": float(end_time)
-                    }
-
-                    if word in word_library:
-                        word_library[word].append(word_data)
-                    else:
-                        word_library[word] = [word_data]
+        manifest = word_library.setdefault("manifest", {})
+
+        if word_library.get("version", 1) < LIBRARY_VERSION:
+            # ingest the .rec files that are still around again to add word positions
+            manifest.clear()
+            word_library["version"] = LIBRARY_VERSION
+        source_index = {source_media: idx for idx, source_media in enumerate(sources)}
+
+        # the stats are updated along with the library if they match it, otherwise rebuilt after
+        stats = LibraryStats(self.word_library_path + ".stats")
+        if available:
+            stats.load()
+        stats_current = not available or stats.signature == FuzzyWordIndex.library_signature(self.word_library_path)
+
+        # look for .rec files in the specified directory, unless given the files
+        rec_files = [os.path.abspath(rec_file) for rec_file in (rec_files if rec_files is not None else glob.glob(os.path.join(rec_files_path, "*.rec")))]
+        changed, deleted = plan_rec_updates(manifest, rec_files)
+
+        # sources whose existing occurrences are replaced or pruned
+        drop_srcs = set()
+        for rec_file in deleted:
+            entry = manifest.pop(rec_file)
+            if entry.get("media") in source_index:
+                drop_srcs.add(source_index[entry["media"]])
+
+        parsed = []
+        for rec_file, entry in changed:
+            source_media, words = read_rec_file(rec_file)
+            if source_media not in source_index:
+                source_index[source_media] = len(sources)
+                sources.append(source_media) # add the source to the library
+
+            old_entry = manifest.get(rec_file)
+            if old_entry and old_entry.get("media") in source_index:
+                drop_srcs.add(source_index[old_entry["media"]])
+            drop_srcs.add(source_index[source_media])
+
+            entry["media"] = source_media
+            manifest[rec_file] = entry
+            parsed.append((source_index[source_media], words))
+
+        # unchanged .rec files sharing a dropped source have to be ingested again
+        changed_files = {rec_file for rec_file, _ in changed}
+        for rec_file, entry in manifest.items():
+            if rec_file not in changed_files and source_index.get(entry.get("media")) in drop_srcs:
+                _, words = read_rec_file(rec_file)
+                parsed.append((source_index[entry["media"]], words))
+
+        if not parsed and not drop_srcs and available:
+            print(f"Word library is up to date: {self.word_library_path}")
+            self.word_library = word_library
+            return
 
-        with open(self.word_library_path, "w") as f:
-            json.dump(word_library, f, indent=2)
+        if drop_srcs:
+            for key in list(word_library.keys()):
+                if key in RESERVED_KEYS:
+                    continue
+                occurrences = [o for o in word_library[key] if o["src"] not in drop_srcs]
+                if stats_current and len(occurrences) < len(word_library[key]):
+                    for o in word_library[key]:
+                        if o["src"] in drop_srcs:
+                            stats.add(key_word(key), sources[o["src"]], o["A"], o["B"], -1)
+                if occurrences:
+                    word_library[key] = occurrences
+                else:
+                    del word_library[key]
+
+        # positions carry on from one .rec file of a source to the next, so they stay unique per source
+        next_position = Counter()
+        for src, words in parsed:
+            if stats_current:
+                stats.add_words(sources[src], words)
+            first_position = next_position[src]
+            next_position[src] += len(words)
+            for position, (word, start_time, end_time) in enumerate(words, first_position):
+                word_data = {
+                    "src": src,
+                    "A": start_time,
+                    "B": end_time,
+                    "P": position
+                }
+
+                key = word_key(word)
+                if key in word_library:
+                    word_library[key].append(word_data)
+                else:
+                    word_library[key] = [word_data]
+
+        # a memory-mapped library has to let go of the file before it is replaced
+        if hasattr(self.word_library, "close"):
+            self.word_library.close()
+
+        write_library(self.word_library_path, word_library)
+
+        if not stats_current:
+            stats = LibraryStats.from_library(word_library, stats.stats_path)
+        stats.signature = FuzzyWordIndex.library_signature(self.word_library_path)
+        stats.save()
+
+        self.word_library = word_library
+        self.fuzzy_index = None
+        self.stats = stats
+
+        if verbose == True:
+            print(f"{len(changed)} new or changed, {len(deleted)} removed, {len(rec_files) - len(changed)} unchanged .rec files")
 
         if available == False:
             print(f"Word library created: {self.word_library_path}")
@@ -88,21 +777,346 @@ class WordSegmentLibrary:
             print(f"Word library updated: {self.word_library_path}")
 
 
-    def creator(self, input_sentence):
+    def librarian_streaming(self, rec_files_path=".", jobs=1):
+        """
+        Build a new library from the .rec files in the specified directory with jobs parser
+        processes, writing it (and its stats) as the merged words stream in rather than
+        holding the library in memory.
+        """
+        rec_files = [os.path.abspath(rec_file) for rec_file in glob.glob(os.path.join(rec_files_path, "*.rec"))]
+        library_dir = os.path.dirname(os.path.abspath(self.word_library_path))
+
+        # the runs can be as big as the library, keep them next to it rather than in /tmp
+        with tempfile.TemporaryDirectory(prefix="chopitup_ingest_", dir=library_dir) as temp_dir:
+            tasks = [(first, rec_files[first:first + STREAM_BATCH_FILES], os.path.join(temp_dir, f"run_{first:08d}.txt"))
+                     for first in range(0, len(rec_files), STREAM_BATCH_FILES)]
+            run_paths = [run_path for _, _, run_path in tasks]
+
+            with profiling.span("ingest.parse", files=len(rec_files)), multiprocessing.Pool(jobs) as pool:
+                files = [file for batch in pool.imap(parse_rec_batch, tasks) for file in batch]
+
+                level = 0
+                while len(run_paths) > MERGE_FANIN:
+                    groups = [run_paths[start:start + MERGE_FANIN] for start in range(0, len(run_paths), MERGE_FANIN)]
+                    run_paths = [os.path.join(temp_dir, f"merge_{level}_{idx:06d}.txt") for idx in range(len(groups))]
+                    pool.map(merge_runs, list(zip(groups, run_paths)), chunksize=1)
+                    level += 1
+
+            # sources are numbered in order of first appearance, as librarian() does
+            sources = []
+            source_index = {}
+            manifest = {}
+            file_srcs = []
+            file_positions = []
+            next_position = Counter()
+            for rec_file, (entry, source_media, word_count) in zip(rec_files, files):
+                if source_media not in source_index:
+                    source_index[source_media] = len(sources)
+                    sources.append(source_media)
+                entry["media"] = source_media
+                manifest[rec_file] = entry
+                src = source_index[source_media]
+                file_srcs.append(src)
+                file_positions.append(next_position[src])
+                next_position[src] += word_count
+
+            stats = LibraryStats(self.word_library_path + ".stats")
+
+            def counted(words):
+                for key, occurrences in words:
+                    for o in occurrences:
+                        stats.add(key_word(key), sources[o["src"]], o["A"], o["B"])
+                    yield key, occurrences
+
+            meta = {"sources": sources, "manifest": manifest, "version": LIBRARY_VERSION}
+            with profiling.span("ingest.write"):
+                write_library_stream(self.word_library_path, meta, counted(merged_occurrences(run_paths, file_srcs, file_positions)))
+
+        stats.signature = FuzzyWordIndex.library_signature(self.word_library_path)
+        stats.save()
+
+        # loaded again when needed, rather than kept from the build
+        self.word_library = None
+        self.fuzzy_index = None
+        self.stats = stats
+
+        if verbose == True:
+            print(f"{len(rec_files)} .rec files parsed by {jobs} processes")
+        print(f"Word library created: {self.word_library_path}")
+
+    def librarian_sqlite(self, rec_files_path=".", rec_files=None):
+        """
+        librarian() for SQLite libraries: the database is updated in place, one transaction
+        per source, so the library stays readable while it is being updated.
+        Every source a new, changed or deleted .rec file belongs (or belonged) to is ingested
+        again from all of its current .rec files.
+        """
+        available = os.path.exists(self.word_library_path)
+        if not isinstance(self.word_library, SqliteWordLibrary):
+            self.word_library = SqliteWordLibrary(self.word_library_path)
+        library = self.word_library
+
+        manifest = library.manifest()
+        if library.version() < LIBRARY_VERSION:
+            manifest = {}
+            library.set_version(LIBRARY_VERSION)
+
+        rec_files = [os.path.abspath(rec_file) for rec_file in (rec_files if rec_files is not None else glob.glob(os.path.join(rec_files_path, "*.rec")))]
+        changed, deleted = plan_rec_updates(manifest, rec_files)
+
+        stats = LibraryStats(self.word_library_path + ".stats")
+        stats.load()
+        stats_current = stats.signature == self.library_stats_signature()
+
+        def source_words(source_media):
+            # the database holds library keys, the stats are kept by word
+            return [(key_word(key), start_time, end_time) for key, start_time, end_time in library.source_words(source_media)]
+
+        def rec_keys(rec_file):
+            source_media, words = read_rec_file(rec_file)
+            return source_media, [(word_key(word), start_time, end_time) for word, start_time, end_time in words]
+
+        groups = {}   # media -> [(rec_file, entry, words)]
+        for rec_file, entry in changed:
+            source_media, keys = rec_keys(rec_file)
+            entry["media"] = source_media
+            groups.setdefault(source_media, []).append((rec_file, entry, keys))
+            old_entry = manifest.get(rec_file)
+            if old_entry and old_entry["media"] != source_media:
+                # the file moved to another source, the one it was in loses its words
+                groups.setdefault(old_entry["media"], [])
+
+        removed = {}  # media -> deleted .rec files
+        for rec_file in deleted:
+            source_media = manifest.pop(rec_file)["media"]
+            removed.setdefault(source_media, []).append(rec_file)
+            groups.setdefault(source_media, [])
+
+        # unchanged .rec files sharing one of those sources have to be ingested again
+        changed_files = {rec_file for rec_file, _ in changed}
+        for rec_file, entry in manifest.items():
+            if rec_file not in changed_files and entry["media"] in groups:
+                groups[entry["media"]].append((rec_file, entry, rec_keys(rec_file)[1]))
+
+        for source_media, recs in groups.items():
+            if stats_current:
+                stats.add_words(source_media, source_words(source_media), -1)
+                for _, _, keys in recs:
+                    stats.add_words(source_media, [(key_word(key), a, b) for key, a, b in keys])
+            library.ingest(source_media, recs, removed.get(source_media, ()))
+
+        library.update_manifest({rec_file: entry for rec_file, entry in manifest.items() if rec_file not in changed_files})
+        if deleted or changed:
+            library.prune_words()
+            library.next_generation()
+
+        if deleted or changed or not stats_current:
+            if not stats_current:
+                stats = LibraryStats.from_library(library, stats.stats_path)
+            stats.signature = self.library_stats_signature()
+            stats.save()
+        self.fuzzy_index = None
+        self.stats = stats
+
+        if verbose == True:
+            print(f"{len(changed)} new or changed, {len(deleted)} removed, {len(rec_files) - len(changed)} unchanged .rec files")
+
+        if not changed and not deleted and available:
+            print(f"Word library is up to date: {self.word_library_path}")
+        elif available == False:
+            print(f"Word library created: {self.word_library_path}")
+        else:
+            print(f"Word library updated: {self.word_library_path}")
+
+    def creator(self, input_sentence, phrases=True, locality=False):
         """
         Select word segments from the library based on the input sentence.
+        With phrases, runs of consecutive words that a source contains in the same order
+        are taken as one continuous segment, longest run first.
+        With locality, occurrences are chosen by plan_segments() to use few sources and short seeks.
         """
+        if locality:
+            return self.plan_segments(input_sentence, phrases)["segments"]
+
         input_words = input_sentence.lower().split()
         selected_segments = []
+        positions = {}
 
-        for word in input_words:
-            if word in self.word_library:
-                selected_segments.append(self.word_library[word][0])
-            else:
+        idx = 0
+        while idx < len(input_words):
+            word = input_words[idx]
+            if word_key(word) not in self.word_library:
                 print(f"Word '{word}' not found in the library")
+                idx += 1
+                continue
+
+            segment, length = self.word_library[word_key(word)][0], 1
+            if phrases:
+                segment, length = self.longest_phrase(input_words, idx, positions) or (segment, length)
+
+            selected_segments.append(segment)
+            idx += length
 
         return selected_segments
 
+    def word_positions(self, word, positions):
+        """
+        Map (src, P) -> occurrence for a word, memoized in the positions dict.
+        """
+        if word not in positions:
+            occurrences = self.word_library[word_key(word)] if word_key(word) in self.word_library else []
+            positions[word] = {(o["src"], o["P"]): o for o in occurrences if "P" in o}
+        return positions[word]
+
+    def longest_phrase(self, input_words, idx, positions):
+        """
+        Find the longest run of input_words starting at idx that appears contiguously in a source.
+        Returns (segment, run length) for runs of 2 words or more, or None.
+        """
+        # (src, position of the first word, first occurrence, last occurrence)
+        runs = [(src, position, o, o) for (src, position), o in self.word_positions(input_words[idx], positions).items()]
+        length = 1
+
+        while runs and idx + length < len(input_words):
+            next_positions = self.word_positions(input_words[idx + length], positions)
+            extended = []
+            for src, position, first, previous in runs:
+                last = next_positions.get((src, position + length))
+                if last is not None and self.continues(previous, last):
+                    extended.append((src, position, first, last))
+            if not extended:
+                break
+            runs = extended
+            length += 1
+
+        if length < 2:
+            return None
+
+        src, _, first, last = runs[0]
+        return {"src": src, "A": first["A"], "B": last["B"], "words": length}, length
+
+    def transition_cost(self, last, occurrence, sources, phrases):
+        """
+        Estimated cost of following the last chosen occurrence with occurrence,
+        sources is the set of sources already opened.
+        """
+        if last is None:
+            return self.CUT_COST + self.SOURCE_OPEN_COST
+        if phrases and self.continues(last, occurrence):
+            return 0.0
+
+        cost = self.CUT_COST
+        if occurrence["src"] not in sources:
+            cost += self.SOURCE_OPEN_COST
+        elif occurrence["src"] != last["src"]:
+            cost += self.SOURCE_SWITCH_COST
+        elif occurrence["A"] >= last["B"]:
+            cost += (occurrence["A"] - last["B"]) / 60.0 * self.SEEK_COST_PER_MINUTE
+        else:
+            cost += self.BACKWARD_SEEK_COST
+        return cost
+
+    @classmethod
+    def continues(cls, last, occurrence):
+        """
+        True if occurrence is the word spoken right after last in the same source,
+        without a pause longer than PHRASE_MAX_GAP in between. Positions carry on from one
+        transcript of a source to the next, so occurrence also has to start once last has ended,
+        which two transcripts of the same stretch of media never do at their seam.
+        """
+        return (occurrence["src"] == last["src"] and "P" in occurrence and "P" in last
+                and occurrence["P"] == last["P"] + 1
+                and last["B"] <= occurrence["A"] and occurrence["A"] - last["B"] <= cls.PHRASE_MAX_GAP)
+
+    def plan_segments(self, input_sentence, phrases=True):
+        """
+        Choose an occurrence for every word of the sentence so the render opens as few
+        sources and seeks as little as possible, with a beam search over the candidates
+        (bounded by PLAN_BEAM_WIDTH and PLAN_MAX_CANDIDATES per word, so long sentences stay fast).
+        Returns a plan dict with the segments, the estimated cost, and the sources used.
+        """
+        words = []
+        for word in input_sentence.lower().split():
+            if word_key(word) in self.word_library:
+                words.append(word)
+            else:
+                print(f"Word '{word}' not found in the library")
+
+        word_occurrences = [self.word_library[word_key(word)] for word in words]
+
+        # sources that can supply the most words of the sentence are tried first
+        source_score = Counter()
+        for occurrences in word_occurrences:
+            source_score.update({o["src"] for o in occurrences})
+
+        positions = {}
+        # states are (cost, sources opened, last occurrence, chosen, extendable) where chosen
+        # is a (occurrence, previous chosen) chain
+        beam = [(0.0, frozenset(), None, None, 1)]
+
+        for idx, (word, occurrences) in enumerate(zip(words, word_occurrences)):
+            candidates = sorted(occurrences, key=lambda o: (-source_score[o["src"]], o["src"], o["A"]))[:self.PLAN_MAX_CANDIDATES]
+            next_positions = {}
+            if phrases:
+                # occurrences that are followed by the next word can start or carry on a run
+                if idx + 1 < len(words):
+                    next_positions = self.word_positions(words[idx + 1], positions)
+                    starts = [o for o in occurrences if "P" in o and (o["src"], o["P"] + 1) in next_positions]
+                    candidates.extend(starts[:self.PLAN_MAX_CANDIDATES])
+
+                # always consider continuing the runs the beam is in the middle of
+                word_positions = self.word_positions(word, positions)
+                for _, _, last, _, _ in beam:
+                    if last is not None and "P" in last:
+                        following = word_positions.get((last["src"], last["P"] + 1))
+                        if following is not None:
+                            candidates.append(following)
+
+            next_states = {}
+            for cost, sources, last, chosen, _ in beam:
+                for occurrence in candidates:
+                    total = cost + self.transition_cost(last, occurrence, sources, phrases)
+                    opened = sources | {occurrence["src"]}
+                    key = (id(occurrence), opened)
+                    if key not in next_states or total < next_states[key][0]:
+                        # on equal cost prefer states the next word can continue from
+                        extendable = 0 if "P" in occurrence and (occurrence["src"], occurrence["P"] + 1) in next_positions else 1
+                        next_states[key] = (total, opened, occurrence, (occurrence, chosen), extendable)
+
+            beam = heapq.nsmallest(self.PLAN_BEAM_WIDTH, next_states.values(), key=lambda state: (state[0], state[4]))
+
+        cost, sources, _, chosen, _ = beam[0]
+        chosen_occurrences = []
+        while chosen is not None:
+            chosen_occurrences.append(chosen[0])
+            chosen = chosen[1]
+        chosen_occurrences.reverse()
+
+        # join the runs of consecutive words back into single segments
+        segments = []
+        run_first = run_last = None
+        run_length = 0
+        for occurrence in chosen_occurrences + [None]:
+            if occurrence is not None and run_last is not None and phrases and self.continues(run_last, occurrence):
+                run_last = occurrence
+                run_length += 1
+                continue
+            if run_first is not None:
+                if run_length == 1:
+                    segments.append(run_first)
+                else:
+                    segments.append({"src": run_first["src"], "A": run_first["A"], "B": run_last["B"], "words": run_length})
+            run_first = run_last = occurrence
+            run_length = 1
+
+        return {"segments": segments, "cost": round(cost, 2), "sources": sorted(sources), "words": words}
+
+    def print_plan(self, plan):
+        print(f"Plan: {len(plan['segments'])} segments from {len(plan['sources'])} source(s), estimated cost {plan['cost']}")
+        for segment in plan["segments"]:
+            words = f" ({segment['words']} words)" if "words" in segment else ""
+            print(f"  ({segment['src']}){self.word_library['sources'][segment['src']]}: {segment['A']}-{segment['B']}{words}")
+
     def creator_from_words_list(self, input_words_list):
         """
         Select word segments from the library based on the input words list, ordered by timestamp.
@@ -110,11 +1124,21 @@ class WordSegmentLibrary:
         input_words = input_words_list.lower().split(',')
         selected_segments = []
 
+        if isinstance(self.word_library, SqliteWordLibrary):
+            # let the database collect and sort the occurrences
+            found = []
+            for word in input_words:
+                if word_key(word.strip()) in self.word_library:
+                    found.append(word_key(word.strip()))
+                else:
+                    print(f"Word '{word.strip()}' not found in the library")
+            return self.word_library.occurrences_by_time(found)
+
         # Collect all word occurrences for the input words
         for word in input_words:
             trimmed_word = word.strip()
-            if trimmed_word in self.word_library:
-                selected_segments.extend(self.word_library[trimmed_word])
+            if word_key(trimmed_word) in self.word_library:
+                selected_segments.extend(self.word_library[word_key(trimmed_word)])
             else:
                 print(f"Word '{trimmed_word}' not found in the library")
 
@@ -127,55 +1151,69 @@ class WordSegmentLibrary:
         """
         Return a list of occurrences for a given word in the library.
         """
-        return self.word_library.get(word, [])
+        return self.word_library.get(word_key(word), [])
 
-    def library_stats(self, word=None):
+    def library_stats(self, word=None, json_output=False):
         """
-        Print statistics about the words in the library.
+        Print statistics about the words in the library, as JSON with json_output.
         """
-        if word and word != "":
-            word = word.lower()
-            count = 0
-            if word in self.word_library:
-                print(f"Statistics for the word '{word}':")
-                occurrences = self.word_library[word]
-                for idx, occurrence in enumerate(occurrences):
-                    src = occurrence["src"]
-                    start_time = occurrence["A"]
-                    end_time = occurrence["B"]
-                    duration = end_time - start_time
-                    source_file = self.word_library["sources"][src]
-                    count += 1
-                    if verbose == True:
-                        print(f"  Occurrence {idx + 1}: File: {source_file}, Start: {start_time}, End: {end_time}, Duration: {duration}")
-
-                print(f"occurrences: {count}")
-            else:
-                print(f"Word '{word}' not found in the library.")
-
-            return
-
-        word_frequencies = Counter()
-        word_lengths = []
-
-        for word, occurrences in self.word_library.items():
-            if word != "sources":
-                word_frequencies[word] = len(occurrences)
-                word_lengths.append((word, len(word)))
-
-        total_words = sum(word_frequencies.values())
-        unique_words = len(word_frequencies)
+        stats = self.library_stats_data(word, details=verbose)
+        if json_output:
+            print(json.dumps(stats, indent=2))
+        else:
+            print_library_stats(stats)
 
-        print(f"Total words in library: {total_words}")
-        print(f"Unique words in library: {unique_words}")
+    def library_stats_data(self, word=None, details=False):
+        """
+        Statistics about the words in the library, or about a single word, as a dict.
+        With details, the per-occurrence list is included for a single word.
+        """
+        stats = self.get_library_stats()
 
-        print("\nTop 20 words in the library:")
-        for word, frequency in word_frequencies.most_common(20):
-            print(f"{word}: {frequency}")
+        if word and word != "":
+            word = word.lower()
+            word_stats = stats.word_stats(word)
+            if details and word_stats["found"]:
+                if self.word_library is None:
+                    self.load_word_library()
+                word_stats["details"] = [{
+                    "file": self.word_library["sources"][occurrence["src"]],
+                    "A": occurrence["A"],
+                    "B": occurrence["B"],
+                    "duration": occurrence["B"] - occurrence["A"],
+                } for occurrence in self.word_library[word_key(word)]]
+            return word_stats
+
+        return stats.get_summary()
+
+    def library_stats_signature(self):
+        """
+        What the stats file has to have been saved against to be current: the library file
+        signature, or for SQLite libraries (whose files change without updates) the update count.
+        """
+        if self.word_library_path.endswith(LIBRARY_FORMATS["sqlite"]) and os.path.exists(self.word_library_path):
+            if not isinstance(self.word_library, SqliteWordLibrary):
+                self.load_word_library()
+            return ["generation", self.word_library.generation()]
+        return FuzzyWordIndex.library_signature(self.word_library_path)
 
-        print("\nTop 20 longest words in the library:")
-        for word, length in sorted(word_lengths, key=lambda x: x[1], reverse=True)[:20]:
-            print(f"{word}: {length}")
+    def get_library_stats(self):
+        """
+        Load the stats kept next to the library, rebuilding them if the library has changed
+        since they were saved. The library is only loaded for a rebuild.
+        """
+        if self.stats is None:
+            stats = LibraryStats(self.word_library_path + ".stats")
+            stats.load()
+            signature = self.library_stats_signature()
+            if signature is None or stats.signature != signature:
+                if self.word_library is None:
+                    self.load_word_library()
+                stats = LibraryStats.from_library(self.word_library, stats.stats_path if signature else None)
+                stats.signature = signature
+                stats.save()
+            self.stats = stats
+        return self.stats
 
     def check_string(self, input_string):
         """
@@ -195,6 +1233,9 @@ class WordSegmentLibrary:
                 if word != available_word:
                     substitution_made = True
                     print(f"Alternative used for '{word}': '{available_word}'")
+                    if verbose == True:
+                        ranked = ", ".join(f"{alternative} ({similarity:.2f})" for alternative, similarity in self.get_alternative_words(word))
+                        print(f"  candidates: {ranked}")
             else:
                 print(f"Word '{word}' not found in the library, and no suitable alternative found")
                 substitution_made = True
@@ -208,36 +1249,423 @@ class WordSegmentLibrary:
 
         return available_words
 
+    def get_fuzzy_index(self):
+        """
+        Load the persisted similarity index, updating it if the library has changed since it was built.
+        """
+        if self.fuzzy_index is None:
+            with profiling.span("fuzzy.index"):
+                index_path = self.word_library_path + ".fuzzy" if os.path.exists(self.word_library_path) else None
+                self.fuzzy_index = FuzzyWordIndex(index_path)
+                self.fuzzy_index.load()
+                if self.fuzzy_index.update(self.word_library, FuzzyWordIndex.library_signature(self.word_library_path)):
+                    self.fuzzy_index.save()
+        return self.fuzzy_index
+
     def get_alternative_word(self, word):
         """
         Find an alternative word in the library with the same starting letter,
         similar length, and the highest similarity ratio.
         """
-        if word in self.word_library:
+        if word_key(word) in self.word_library:
             return word
 
-        alternative_word = None
-        highest_similarity = 0
+        fuzzy_index = self.get_fuzzy_index()
+        with profiling.span("fuzzy.match", word=word):
+            matches = fuzzy_index.best_matches(word)
+        return matches[0][0] if matches else None
 
-        for available_word in self.word_library.keys():
-            if available_word == "sources":
-                continue
+    def get_alternative_words(self, word, k=5):
+        """
+        Return up to k alternatives for a word as (word, similarity) pairs, best first.
+        """
+        return self.get_fuzzy_index().best_matches(word, k)
+
+def print_library_stats(stats):
+    """
+    Print the statistics returned by WordSegmentLibrary.library_stats_data().
+    """
+    if "word" in stats:
+        if not stats["found"]:
+            print(f"Word '{stats['word']}' not found in the library.")
+            return
+
+        print(f"Statistics for the word '{stats['word']}':")
+        for idx, occurrence in enumerate(stats.get("details", [])):
+            print(f"  Occurrence {idx + 1}: File: {occurrence['file']}, Start: {occurrence['A']}, End: {occurrence['B']}, Duration: {occurrence['duration']}")
+        print(f"occurrences: {stats['occurrences']}")
+        print(f"average duration: {stats['duration_mean']}s")
+        return
 
-            # Check if the word has the same starting letter and similar length
-            if word[0] == available_word[0] and abs(len(word) - len(available_word)) <= 2:
-                similarity = SequenceMatcher(None, word, available_word).ratio()
+    print(f"Total words in library: {stats['total_words']}")
+    print(f"Unique words in library: {stats['unique_words']}")
 
-                if similarity > highest_similarity:
-                    highest_similarity = similarity
-                    alternative_word = available_word
+    print("\nTop 20 words in the library:")
+    for word, frequency in stats["top_words"]:
+        print(f"{word}: {frequency}")
 
-        return alternative_word
+    print("\nTop 20 longest words in the library:")
+    for word, length in stats["longest_words"]:
+        print(f"{word}: {length}")
+
+    if verbose == True:
+        print("\nWord durations:")
+        lower = 0.0
+        for upper, count in zip(stats["duration_bins"] + [None], stats["duration_histogram"]):
+            print(f"{lower}-{upper}s: {count}" if upper is not None else f"{lower}s and longer: {count}")
+            lower = upper
+
+        print("\nWords per source:")
+        for media, count in stats["sources"]:
+            print(f"{media}: {count}")
 
 # ------------------------------
+# federated queries across several --label libraries
+
+class FederatedWordLibrary(Mapping):
+    """
+    Read-only, dict-like union of several word libraries.
+    Which words a member has is read from its alternatives index (the .fuzzy file next to
+    the library), so a member is only loaded once a word it contains is looked up. Sources
+    of the loaded members are appended to one merged "sources" list and their occurrences
+    are returned with src shifted by the member's offset in it.
+    """
+
+    def __init__(self, word_library_paths):
+        self.members = []       # WordSegmentLibrary per path, word_library loaded on first use
+        self.vocabularies = []  # set of words per member
+        self.offsets = {}       # member index -> offset of its sources in self.sources
+        self.sources = []
+
+        for path in word_library_paths:
+            member = WordSegmentLibrary(path)
+            fuzzy_index = FuzzyWordIndex(path + ".fuzzy")
+            fuzzy_index.load()
+            signature = FuzzyWordIndex.library_signature(path)
+            if fuzzy_index.signature != signature:
+                # no current vocabulary for this one, load it and save one for next time
+                member.load_word_library()
+                fuzzy_index.update(member.word_library, signature)
+                fuzzy_index.save()
+            member.fuzzy_index = fuzzy_index
+            self.members.append(member)
+            self.vocabularies.append({word for word in fuzzy_index.words if word is not None})
+
+    def member(self, idx):
+        """
+        Load member idx if needed and merge its sources, returns (member, source offset).
+        """
+        if idx not in self.offsets:
+            member = self.members[idx]
+            if member.word_library is None:
+                member.load_word_library()
+                if verbose == True:
+                    print(f"Loaded word library: {member.word_library_path}")
+            self.offsets[idx] = len(self.sources)
+            self.sources.extend(member.word_library["sources"])
+        return self.members[idx], self.offsets[idx]
+
+    def __getitem__(self, key):
+        if key == "sources":
+            return self.sources
+        if key == "manifest":
+            return {}
+        if key == "version":
+            return LIBRARY_VERSION
+
+        occurrences = []
+        for idx, vocabulary in enumerate(self.vocabularies):
+            if key_word(key) in vocabulary:
+                member, offset = self.member(idx)
+                occurrences.extend(dict(o, src=o["src"] + offset) for o in member.word_library[key])
+        if not occurrences:
+            raise KeyError(key)
+        return occurrences
+
+    def __contains__(self, key):
+        return key in RESERVED_KEYS or any(key_word(key) in vocabulary for vocabulary in self.vocabularies)
+
+    def __iter__(self):
+        yield from RESERVED_KEYS
+        seen = set()
+        for member in self.members:
+            for word in member.fuzzy_index.words:
+                if word is not None and word not in seen:
+                    seen.add(word)
+                    yield word_key(word)
+
+    def __len__(self):
+        return len(RESERVED_KEYS) + len(set().union(*self.vocabularies))
+
+    def best_matches(self, word, k=1):
+        """
+        FuzzyWordIndex.best_matches() over the union, merged from the members' indexes
+        (ties go to the earlier library, as a scan over the merged vocabulary would).
+        """
+        ranked = []
+        for idx, member in enumerate(self.members):
+            ranked.extend((-similarity, idx, rank, match) for rank, (match, similarity) in enumerate(member.fuzzy_index.best_matches(word, k)))
+        ranked.sort()
+
+        matches = []
+        for negative_similarity, _, _, match in ranked:
+            if all(match != found for found, _ in matches):
+                matches.append((match, -negative_similarity))
+        return matches[:k]
+
+
+class FederatedSegmentLibrary(WordSegmentLibrary):
+    """
+    WordSegmentLibrary over several libraries at once (--label a,b or --label 'show_*').
+    Queries work as for a single library, libraries are generated one label at a time.
+    """
+
+    def __init__(self, word_library_paths):
+        super().__init__(None)
+        self.word_library_paths = word_library_paths
+
+    def load_word_library(self):
+        self.word_library = FederatedWordLibrary(self.word_library_paths)
 
-# assemble segments into a video    
-def assemble_video(media_library, segments, output_filename):
+    def librarian(self, rec_files_path=".", rec_files=None):
+        print("Libraries are generated one --label at a time")
+
+    def get_fuzzy_index(self):
+        # the federated library merges the alternatives from its members' indexes
+        return self.word_library
+
+    def get_library_stats(self):
+        # the members' stats add up, without loading the members
+        if self.stats is None:
+            self.stats = LibraryStats()
+            for member in self.word_library.members:
+                self.stats.merge(member.get_library_stats())
+        return self.stats
+
+
+# ------------------------------
+
+class SegmentCache:
+    """
+    Content-addressed cache of rendered word segments, kept in data_dir.
+    A segment is keyed by its source file identity (path, size, mtime), its A/B times and
+    the encode settings, entries are evicted least recently used first once the cache
+    grows past max_bytes.
+    Several processes (batch workers, server renders) can share the cache: each one merges the
+    entries it added or used into the index under a lock when it saves, and renders hold a
+    shared lock while they use cached files, which eviction needs exclusively.
+    """
+    ENCODE_SETTINGS = {"codec": "libx264", "audio_codec": "aac", "preset": "medium", "audio_fps": 44100}
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self.changes = {}              # entries added or used since the index was read
+        self.stat_changes = Counter()  # stats counted since the index was read
+        with self.locked("index"):
+            self.load()
+
+    @contextlib.contextmanager
+    def locked(self, name, shared=False, blocking=True):
+        """
+        Hold the cache's <name>.lock file, yields False when not blocking and the lock is taken.
+        """
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(self.cache_dir, name + ".lock"), "a") as f:
+            try:
+                fcntl.flock(f, (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB))
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def in_use(self):
+        """
+        Hold while cached files are looked up and read, so no other process evicts them.
+        """
+        return self.locked("use", shared=True)
+
+    def load(self):
+        self.entries = {}
+        self.stats = {"hits": 0, "misses": 0, "bytes_saved": 0}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as f:
+                index = json.load(f)
+            self.entries = index["entries"]
+            self.stats = index["stats"]
+
+    def key(self, video_path, start_time, end_time):
+        stat = os.stat(video_path)
+        identity = [os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, start_time, end_time, self.ENCODE_SETTINGS]
+        return hashlib.sha1(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + ".mp4")
+
+    def get(self, key):
+        """
+        Return the cached segment's entry or None, counting the hit or miss.
+        """
+        entry = self.entries.get(key)
+        if entry is not None and not os.path.exists(self.path(key)):
+            del self.entries[key]
+            entry = None
+
+        if entry is None:
+            self.count("misses")
+            profiling.count("cache.misses")
+            return None
+
+        entry["last_used"] = time.time()
+        self.changes[key] = entry
+        self.count("hits")
+        profiling.count("cache.hits")
+        self.count("bytes_saved", entry["size"])
+        return entry
+
+    def count(self, name, value=1):
+        self.stats[name] += value
+        self.stat_changes[name] += value
+
+    def render(self, key, clip):
+        """
+        Encode a subclip into the cache and return its entry.
+        """
+        path = self.path(key)
+        temp_path = os.path.join(self.cache_dir, key + ".tmp.mp4")
+        with profiling.span("encode.write_videofile", output=temp_path):
+            clip.write_videofile(temp_path, fps=clip.fps, temp_audiofile=os.path.join(self.cache_dir, key + ".tmp.m4a"),
+                                 logger=None, **self.ENCODE_SETTINGS)
+        os.replace(temp_path, path)
+
+        entry = {
+            "size": os.path.getsize(path),
+            "last_used": time.time(),
+            "params": [clip.w, clip.h, clip.fps, clip.audio is not None],
+        }
+        self.entries[key] = entry
+        self.changes[key] = entry
+        return entry
+
+    def evict(self, keep=()):
+        """
+        Remove least recently used segments until the cache fits max_bytes, never removing keys in keep.
+        Only call with the index locked and no process using the cache (see save()).
+        """
+        for key in [key for key in self.entries if not os.path.exists(self.path(key))]:
+            del self.entries[key]
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            total -= self.entries[key]["size"]
+            del self.entries[key]
+            if os.path.exists(self.path(key)):
+                os.remove(self.path(key))
+
+    def save(self, keep=()):
+        """
+        Merge this process's changes into the index on disk, evicting down to max_bytes
+        (keeping the keys in keep) unless another process is using the cache right now.
+        """
+        with self.locked("index"):
+            changes, stat_changes = self.changes, self.stat_changes
+            self.load()
+            for key, entry in changes.items():
+                known = self.entries.get(key)
+                if known is None or known["last_used"] < entry["last_used"]:
+                    self.entries[key] = entry
+            for name, value in stat_changes.items():
+                self.stats[name] += value
+            self.changes, self.stat_changes = {}, Counter()
+
+            with self.locked("use", blocking=False) as unused:
+                if unused:
+                    self.evict(keep)
+
+            temp_path = self.index_path + ".tmp"
+            with open(temp_path, "w") as f:
+                json.dump({"entries": self.entries, "stats": self.stats}, f)
+            os.replace(temp_path, self.index_path)
+
+    def print_stats(self):
+        lookups = self.stats["hits"] + self.stats["misses"]
+        hit_rate = 100.0 * self.stats["hits"] / lookups if lookups else 0.0
+        total = sum(entry["size"] for entry in self.entries.values())
+        print(f"Segment cache: {self.cache_dir}")
+        print(f"Segments cached: {len(self.entries)} ({total / 1e6:.1f} MB of {self.max_bytes / 1e6:.0f} MB)")
+        print(f"Hits: {self.stats['hits']}, misses: {self.stats['misses']}, hit rate: {hit_rate:.1f}%")
+        print(f"Bytes saved: {self.stats['bytes_saved'] / 1e6:.1f} MB")
+
+
+# join encoded segment files without re-encoding, using the ffmpeg concat demuxer
+# (all inputs must share codec parameters), returns False if ffmpeg failed
+def concat_segment_files(paths, output_filename, extra_args=()):
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+        for path in paths:
+            escaped_path = os.path.abspath(path).replace("'", "'\\''")
+            f.write(f"file '{escaped_path}'\n")
+        list_path = f.name
+
+    try:
+        with profiling.span("ffmpeg.concat", files=len(paths)):
+            result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                     "-i", list_path, "-c", "copy"] + list(extra_args) + [output_filename],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return False
+    finally:
+        os.remove(list_path)
+
+    if result.returncode != 0:
+        print(result.stderr.decode("utf-8", errors="replace"))
+    return result.returncode == 0
+
+
+# assemble segments into a video
+# each source file is opened (and probed) once and shared by all of its segments. subclips are
+# lazy, the frames are only decoded by write_videofile, in output order.
+# sources can be a dict of src -> VideoFileClip owned by the caller, to share open
+# sources between renders, otherwise the sources are closed when done
+# assembler "smartcut" cuts with ffmpeg directly (see assemble_video_smartcut), falling back
+# to moviepy when the sources aren't eligible, "parallel" encodes chunks of the output in
+# jobs processes (see assemble_video_parallel), "streaming" writes frames to one encoder as
+# the segments are read, with at most max_readers sources open (see assemble_video_streaming)
+def assemble_video(media_library, segments, output_filename, cache=None, sources=None, assembler="moviepy", jobs=None,
+                   max_readers=None):
+    profiling.count("segments", len(segments))
+    if assembler in ("parallel", "streaming") and cache is not None:
+        print(f"The {assembler} assembler doesn't use the segment cache, rendering through the cache with moviepy")
+    if assembler == "smartcut" and assemble_video_smartcut(media_library, segments, output_filename):
+        return
+    if assembler == "parallel" and cache is None and assemble_video_parallel(media_library, segments, output_filename, jobs):
+        return
+    if assembler == "streaming" and cache is None and assemble_video_streaming(media_library, segments, output_filename, max_readers):
+        return
+
+    # moviepy is slow to import, only pay for it when rendering
+    with profiling.span("moviepy.import"):
+        from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    if cache is not None:
+        assemble_video_cached(media_library, segments, output_filename, cache, sources)
+        return
+
+    owned_sources = sources is None
+    if owned_sources:
+        sources = {}
     clips = []
+
     for segment in segments:
         src = segment["src"]
         start_time = segment["A"]
@@ -246,30 +1674,1247 @@ def assemble_video(media_library, segments, output_filename):
 
         print(f"({src}){video_path}: {start_time}-{end_time}")
 
-        clip = VideoFileClip(video_path).subclip(start_time, end_time)
-        clips.append(clip)
+        if src not in sources:
+            with profiling.span("source.open", path=video_path):
+                sources[src] = VideoFileClip(video_path)
+            profiling.count("sources.opened")
+        with profiling.span("clip.subclip"):
+            clips.append(sources[src].subclip(start_time, end_time))
 
     final_clip = concatenate_videoclips(clips)
-    final_clip.write_videofile(output_filename)
+    with profiling.span("encode.write_videofile", output=output_filename):
+        final_clip.write_videofile(output_filename)
 
-    for clip in clips:
-        clip.close()
     final_clip.close()
+    if owned_sources:
+        for source in sources.values():
+            source.close()
+
+
+
+# assemble through the segment cache: only segments missing from the cache are rendered,
+# the cached files are then joined directly when they share encode parameters
+def assemble_video_cached(media_library, segments, output_filename, cache, sources=None):
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    # the shared lock keeps other processes from evicting the files while they are used
+    with cache.in_use():
+        owned_sources = sources is None
+        if owned_sources:
+            sources = {}
+        keys = [None] * len(segments)
+        params = set()
+        rendered = 0
+
+        # missing segments are encoded as they are found, in source and timestamp order so each
+        # source is decoded forward, then the keys go back into the requested order
+        cut_order = sorted(range(len(segments)), key=lambda idx: (segments[idx]["src"], segments[idx]["A"]))
+        for idx in cut_order:
+            segment = segments[idx]
+            src = segment["src"]
+            start_time = segment["A"]
+            end_time = segment["B"]
+            video_path = media_library.word_library["sources"][src]
+
+            key = cache.key(video_path, start_time, end_time)
+            entry = cache.get(key)
+            if entry is None:
+                print(f"({src}){video_path}: {start_time}-{end_time}")
+                if src not in sources:
+                    with profiling.span("source.open", path=video_path):
+                        sources[src] = VideoFileClip(video_path)
+                    profiling.count("sources.opened")
+                with profiling.span("clip.subclip"):
+                    clip = sources[src].subclip(start_time, end_time)
+                entry = cache.render(key, clip)
+                rendered += 1
+            elif verbose == True:
+                print(f"({src}){video_path}: {start_time}-{end_time} (cached)")
+
+            keys[idx] = key
+            params.add(tuple(entry["params"]))
+
+        if owned_sources:
+            for source in sources.values():
+                source.close()
+
+        print(f"{len(segments) - rendered} of {len(segments)} segments taken from the cache")
+
+        paths = [cache.path(key) for key in keys]
+        joined = len(params) == 1 and list(params)[0][3] and concat_segment_files(paths, output_filename)
+        if not joined:
+            # sizes, frame rates or audio differ, re-encode the cached segments into the output
+            clips = [VideoFileClip(path) for path in paths]
+            final_clip = concatenate_videoclips(clips, method="compose")
+            with profiling.span("encode.write_videofile", output=output_filename):
+                final_clip.write_videofile(output_filename)
+            final_clip.close()
+            for clip in clips:
+                clip.close()
+
+    cache.save(keep=set(keys))
+
+
+# ------------------------------
+# smart cut assembly: ffmpeg stream-copies the whole GOPs inside a segment and only re-encodes
+# the partial GOPs at its edges, the parts are joined with the concat demuxer
+
+class KeyframeIndex:
+    """
+    Keyframe times and stream parameters of source files, probed once with ffprobe and kept
+    next to the library (<library>.keyframes). A source is probed again when its size or mtime change.
+    """
+    VERSION = 2
+
+    def __init__(self, index_path=None):
+        self.index_path = index_path
+        self.sources = {}  # path -> {"size", "mtime", "keyframes", "video", "audio"}
+        self.changed = False
+        if index_path and os.path.exists(index_path):
+            try:
+                with open(index_path, "r") as f:
+                    data = json.load(f)
+                if data.get("version") == self.VERSION:
+                    self.sources = data["sources"]
+            except ValueError:
+                pass
+
+    def save(self):
+        if self.index_path and self.changed:
+            with open(self.index_path + ".tmp", "w") as f:
+                json.dump({"version": self.VERSION, "sources": self.sources}, f)
+            os.replace(self.index_path + ".tmp", self.index_path)
+            self.changed = False
+
+    @staticmethod
+    def probe(video_path):
+        """
+        Stream parameters and keyframe times of a file, None if ffprobe can't read it.
+        """
+        try:
+            result = subprocess.run(["ffprobe", "-v", "error", "-show_entries",
+                                     "stream=codec_type,codec_name,profile,level,width,height,pix_fmt,r_frame_rate,time_base,sample_rate,channels",
+                                     "-of", "json", video_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                return None
+            streams = json.loads(result.stdout.decode("utf-8"))["streams"]
+
+            # packet flags tell the keyframes without decoding anything
+            result = subprocess.run(["ffprobe", "-v", "error", "-select_streams", "v:0", "-show_entries",
+                                     "packet=pts_time,flags", "-of", "csv=p=0", video_path],
+                                    stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                return None
+        except (OSError, ValueError):
+            return None
+
+        keyframes = []
+        for line in result.stdout.decode("utf-8").splitlines():
+            fields = line.split(",")
+            if len(fields) >= 2 and "K" in fields[1] and fields[0] not in ("", "N/A"):
+                keyframes.append(float(fields[0]))
+
+        video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+        audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+        return {"keyframes": sorted(keyframes), "video": video, "audio": audio}
+
+    def get(self, video_path):
+        stat = os.stat(video_path)
+        entry = self.sources.get(video_path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            with profiling.span("ffprobe.keyframes", path=video_path):
+                entry = self.probe(video_path) or {"keyframes": [], "video": None, "audio": None}
+            entry.update(size=stat.st_size, mtime=stat.st_mtime)
+            self.sources[video_path] = entry
+            self.changed = True
+        return entry
+
+
+# edges shorter than this are left out rather than encoded on their own (less than a frame or two)
+SMART_CUT_MIN_PART = 0.05
+
+# ffprobe's h264 profile names and the libx264 profile that encodes the edges to match them,
+# sources in other profiles aren't smart cut
+X264_PROFILES = {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main", "High": "high",
+                 "High 10": "high10", "High 4:2:2": "high422", "High 4:4:4 Predictive": "high444"}
+
+
+def smart_cut_params(entries):
+    """
+    The encode parameters shared by all the sources if they can be smart cut together
+    (h264 video and aac audio with the same size, profile, level, pixel format, frame rate,
+    time base and sample format), else None. The re-encoded edges are made with these, so
+    the joined parts don't switch stream parameters part way through.
+    """
+    params = set()
+    for entry in entries:
+        video, audio = entry["video"], entry["audio"]
+        if not video or not audio or video.get("codec_name") != "h264" or audio.get("codec_name") != "aac" or not entry["keyframes"]:
+            return None
+        if video.get("profile") not in X264_PROFILES or not video.get("level", 0) > 0 or not video.get("time_base"):
+            return None
+        params.add((video["width"], video["height"], X264_PROFILES[video["profile"]], video["level"], video["pix_fmt"],
+                    video["r_frame_rate"], video["time_base"], audio["sample_rate"], audio["channels"]))
+    return params.pop() if len(params) == 1 else None
+
+
+def smart_cut_parts(keyframes, start_time, end_time):
+    """
+    Split a segment into (start, end, copy) parts: the span between the first and last keyframes
+    inside it is stream-copied, the partial GOPs before and after are re-encoded.
+    """
+    first = bisect.bisect_left(keyframes, start_time)
+    last = bisect.bisect_right(keyframes, end_time) - 1
+    if first >= len(keyframes) or last < 0 or keyframes[first] >= keyframes[last]:
+        return [(start_time, end_time, False)]
+
+    parts = []
+    if keyframes[first] - start_time >= SMART_CUT_MIN_PART:
+        parts.append((start_time, keyframes[first], False))
+    parts.append((keyframes[first], keyframes[last], True))
+    if end_time - keyframes[last] >= SMART_CUT_MIN_PART:
+        parts.append((keyframes[last], end_time, False))
+    return parts
+
+
+def render_smart_cut_part(video_path, start_time, end_time, copy, params, output_filename):
+    """
+    Cut one part into an MPEG-TS file (which repeats the stream headers in-band, so parts from
+    different encoders can be joined), returns True on success.
+    """
+    width, height, profile, level, pix_fmt, frame_rate, _, sample_rate, channels = params
+    command = ["ffmpeg", "-y", "-loglevel", "error", "-ss", f"{start_time:.6f}", "-i", video_path,
+               "-t", f"{end_time - start_time:.6f}", "-map", "0:v:0", "-map", "0:a:0"]
+    if copy:
+        command += ["-c", "copy"]
+    else:
+        # ffprobe gives the level times ten (e.g. 31 for 3.1)
+        command += ["-c:v", "libx264", "-profile:v", profile, "-level:v", f"{level / 10:.1f}", "-pix_fmt", pix_fmt,
+                    "-r", frame_rate, "-c:a", "aac", "-ar", str(sample_rate), "-ac", str(channels)]
+    command += ["-f", "mpegts", output_filename]
+    try:
+        with profiling.span("smartcut.copy" if copy else "smartcut.encode", path=video_path):
+            result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except OSError:
+        return False
+    if result.returncode != 0 and verbose == True:
+        print(result.stderr.decode("utf-8", errors="replace"))
+    return result.returncode == 0
+
+
+def assemble_video_smartcut(media_library, segments, output_filename):
+    """
+    Assemble with ffmpeg instead of moviepy, stream-copying whole GOPs where possible.
+    Returns False (having written nothing) if the sources aren't eligible or a cut fails,
+    so the caller can fall back to the moviepy path.
+    """
+    if not segments:
+        return False
+
+    index_path = media_library.word_library_path + ".keyframes" if media_library.word_library_path else None
+    keyframe_index = KeyframeIndex(index_path)
+    sources = media_library.word_library["sources"]
+    try:
+        entries = {segment["src"]: keyframe_index.get(sources[segment["src"]]) for segment in segments}
+    except OSError:
+        return False
+    keyframe_index.save()
+
+    params = smart_cut_params(entries.values())
+    if params is None:
+        print("Sources can't be smart cut (they need to be h264/aac with matching parameters), using moviepy")
+        return False
+    # the output keeps the sources' time base, rather than the muxer default the copied timestamps would be rounded to
+    timescale = params[6].split("/")[-1]
+
+    with tempfile.TemporaryDirectory(prefix="chopitup_smartcut_") as temp_dir:
+        paths = []
+        copied = encoded = 0.0
+        for segment in segments:
+            video_path = sources[segment["src"]]
+            print(f"({segment['src']}){video_path}: {segment['A']}-{segment['B']}")
+            for start_time, end_time, copy in smart_cut_parts(entries[segment["src"]]["keyframes"], segment["A"], segment["B"]):
+                path = os.path.join(temp_dir, f"part_{len(paths):06d}.ts")
+                if not render_smart_cut_part(video_path, start_time, end_time, copy, params, path):
+                    print(f"Smart cut failed for {video_path} {start_time}-{end_time}, using moviepy")
+                    return False
+                paths.append(path)
+                if copy:
+                    copied += end_time - start_time
+                else:
+                    encoded += end_time - start_time
+
+        if not concat_segment_files(paths, output_filename, ["-bsf:a", "aac_adtstoasc", "-video_track_timescale", timescale]):
+            print("Joining the smart cut parts failed, using moviepy")
+            return False
+
+    print(f"Smart cut: {copied:.1f}s stream-copied, {encoded:.1f}s re-encoded")
+    return True
+
 
+# ------------------------------
+# parallel chunked encoding: the segment list is split into contiguous chunks of about equal
+# duration, each chunk is encoded by its own process with the same size, frame rate and codec
+# settings, and the chunk files are joined with the concat demuxer without re-encoding
+
+def split_segments(segments, chunks):
+    """
+    Split segments into at most chunks contiguous, non-empty lists of roughly equal total duration.
+    """
+    total = sum(segment["B"] - segment["A"] for segment in segments)
+    parts = []
+    done = 0.0
+    for segment in segments:
+        # start a new chunk once this one has its share of the duration
+        if not parts or (len(parts) < chunks and done >= total * len(parts) / chunks):
+            parts.append([])
+        parts[-1].append(segment)
+        done += segment["B"] - segment["A"]
+    return parts
+
+
+def render_chunk(task):
+    """
+    Parallel assembler worker: task is (sources, segments, output_filename, size, fps, threads).
+    Clips of another size are resized so every chunk has the same stream parameters.
+    Returns (error, has_audio).
+    """
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    sources, segments, output_filename, size, fps, threads = task
+    opened = {}
+    try:
+        clips = []
+        for segment in segments:
+            src = segment["src"]
+            if src not in opened:
+                opened[src] = VideoFileClip(sources[src])
+            clip = opened[src].subclip(segment["A"], segment["B"])
+            if tuple(clip.size) != size:
+                clip = clip.resize(newsize=size)
+            clips.append(clip)
+
+        final_clip = concatenate_videoclips(clips)
+        has_audio = final_clip.audio is not None
+        final_clip.write_videofile(output_filename, fps=fps, threads=threads, temp_audiofile=output_filename + ".m4a",
+                                   logger=None, **SegmentCache.ENCODE_SETTINGS)
+        final_clip.close()
+        return None, has_audio
+    except Exception as e:
+        return str(e) or type(e).__name__, False
+    finally:
+        for source in opened.values():
+            source.close()
+
+
+def assemble_video_parallel(media_library, segments, output_filename, jobs=None):
+    """
+    Encode the output in chunks on jobs processes (default: one per CPU) and join them.
+    Returns False (having written nothing) if there are too few segments to split, jobs is 1
+    or a chunk fails, so the caller can fall back to encoding on one pipeline.
+    """
+    from moviepy.editor import VideoFileClip, concatenate_videoclips
+
+    jobs = jobs if jobs is not None else (os.cpu_count() or 1)
+    chunks = split_segments(segments, min(jobs, len(segments)))
+    if len(chunks) < 2:
+        return False
+
+    sources = media_library.word_library["sources"]
+    # the output takes the size and frame rate of the first segment's source, like concatenate_videoclips
+    with profiling.span("source.open", path=sources[segments[0]["src"]]):
+        first = VideoFileClip(sources[segments[0]["src"]])
+    size, fps = tuple(first.size), first.fps
+    first.close()
+    # share the cores between the encoders instead of each starting a thread per core
+    threads = max(1, (os.cpu_count() or 1) // len(chunks))
+
+    print(f"Encoding {len(segments)} segments in {len(chunks)} chunks of {size[0]}x{size[1]} at {fps} fps")
+    with tempfile.TemporaryDirectory(prefix="chopitup_parallel_") as temp_dir:
+        paths = [os.path.join(temp_dir, f"chunk_{idx:04d}.mp4") for idx in range(len(chunks))]
+        tasks = [(sources, chunk, path, size, fps, threads) for chunk, path in zip(chunks, paths)]
+        with profiling.span("parallel.encode", chunks=len(chunks)):
+            with multiprocessing.Pool(len(chunks)) as pool:
+                results = pool.map(render_chunk, tasks, chunksize=1)
+
+        for idx, (error, _) in enumerate(results):
+            if error:
+                print(f"Encoding chunk {idx} failed - {error}, encoding on one pipeline")
+                return False
+
+        # a chunk without any audio has no audio stream, those can't be joined by stream copy
+        if all(has_audio for _, has_audio in results) and concat_segment_files(paths, output_filename):
+            return True
+
+        clips = [VideoFileClip(path) for path in paths]
+        final_clip = concatenate_videoclips(clips, method="compose")
+        with profiling.span("encode.write_videofile", output=output_filename):
+            final_clip.write_videofile(output_filename)
+        final_clip.close()
+        for clip in clips:
+            clip.close()
+    return True
+
+
+# ------------------------------
+# streaming assembly: segments are read in output order and their frames written straight to a
+# single ffmpeg encoder, the audio to a temporary WAV that is muxed in at the end. Only the
+# max_readers most recently used sources are kept open, so memory and open files stay the
+# same however many segments there are.
+
+DEFAULT_MAX_READERS = 4
+STREAM_AUDIO_FPS = 44100
+
+
+def assemble_video_streaming(media_library, segments, output_filename, max_readers=None):
+    """
+    Assemble with one persistent encoder instead of concatenate_videoclips.
+    Returns False if there is nothing to write, raises RuntimeError if the final mux fails
+    (falling back to another assembler would only encode everything again to hit the same error).
+    """
+    if not segments:
+        return False
+
+    from moviepy.editor import VideoFileClip
+    from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+
+    max_readers = max(1, max_readers or DEFAULT_MAX_READERS)
+    sources = media_library.word_library["sources"]
+    readers = OrderedDict()  # src -> VideoFileClip, least recently used first
+
+    def reader(src):
+        if src in readers:
+            readers.move_to_end(src)
+        else:
+            if len(readers) >= max_readers:
+                _, oldest = readers.popitem(last=False)
+                oldest.close()
+            with profiling.span("source.open", path=sources[src]):
+                readers[src] = VideoFileClip(sources[src])
+            profiling.count("sources.opened")
+        return readers[src]
+
+    with tempfile.TemporaryDirectory(prefix="chopitup_stream_") as temp_dir:
+        video_path = os.path.join(temp_dir, "video.mp4")
+        audio_path = os.path.join(temp_dir, "audio.wav")
+        writer = None
+        frames_written = samples_written = 0
+        has_audio = False
+
+        try:
+            with wave.open(audio_path, "wb") as audio:
+                audio.setnchannels(2)
+                audio.setsampwidth(2)
+                audio.setframerate(STREAM_AUDIO_FPS)
+
+                for segment in segments:
+                    src = segment["src"]
+                    print(f"({src}){sources[src]}: {segment['A']}-{segment['B']}")
+                    clip = reader(src).subclip(segment["A"], segment["B"])
+
+                    # the output takes the size and frame rate of the first segment, like concatenate_videoclips
+                    if writer is None:
+                        size, fps = tuple(clip.size), clip.fps
+                        writer = FFMPEG_VideoWriter(video_path, size, fps, codec="libx264", preset="medium")
+                    if tuple(clip.size) != size:
+                        clip = clip.resize(newsize=size)
+
+                    with profiling.span("stream.frames"):
+                        for frame in clip.iter_frames(fps=fps, dtype="uint8"):
+                            writer.write_frame(frame)
+                            frames_written += 1
+
+                    # audio up to the end of the frames written so far keeps the two in sync
+                    needed = int(round(frames_written * STREAM_AUDIO_FPS / fps)) - samples_written
+                    if clip.audio is not None and needed > 0:
+                        sound = clip.audio.to_soundarray(fps=STREAM_AUDIO_FPS, quantize=True, nbytes=2)
+                        sound = sound.reshape(len(sound), -1)
+                        sound = numpy.repeat(sound, 2, axis=1) if sound.shape[1] == 1 else sound[:, :2]
+                        has_audio = True
+                    else:
+                        sound = numpy.zeros((0, 2), dtype=numpy.int16)
+                    if len(sound) < needed:
+                        sound = numpy.concatenate([sound, numpy.zeros((needed - len(sound), 2), dtype=numpy.int16)])
+                    audio.writeframes(sound[:max(needed, 0)].astype("<i2").tobytes())
+                    samples_written += max(needed, 0)
+        finally:
+            if writer is not None:
+                writer.close()
+            for source in readers.values():
+                source.close()
+
+        profiling.count("frames.written", frames_written)
+        if not has_audio:
+            shutil.move(video_path, output_filename)
+            return True
+
+        try:
+            with profiling.span("ffmpeg.mux"):
+                result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-i", audio_path,
+                                         "-map", "0:v:0", "-map", "1:a:0", "-c:v", "copy", "-c:a", "aac", output_filename],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError as e:
+            raise RuntimeError(f"Muxing the audio into {output_filename} failed: {e}") from e
+        if result.returncode != 0:
+            raise RuntimeError(f"Muxing the audio into {output_filename} failed: {result.stderr.decode('utf-8', errors='replace').strip()}")
+    return True
+
+
+# ------------------------------
+# audio only previews: each source is decoded once to raw mono PCM in data_dir and memory-mapped,
+# a preview is then just slices of those files joined (with short crossfades) into a WAV
+
+PREVIEW_SAMPLE_RATE = 16000
+DEFAULT_CROSSFADE_MS = 10
+
+
+class PcmStore:
+    """
+    Mono 16 bit PCM copies of the sources, decoded with ffmpeg on first use and keyed by the
+    source path, size and mtime, so a changed source is decoded again.
+    Samples are read through numpy.memmap when numpy is installed, else through mmap.
+    """
+
+    def __init__(self, store_dir, sample_rate=PREVIEW_SAMPLE_RATE):
+        self.store_dir = store_dir
+        self.sample_rate = sample_rate
+        self.maps = {}
+        os.makedirs(store_dir, exist_ok=True)
+
+    def path(self, video_path):
+        stat = os.stat(video_path)
+        key = hashlib.sha1(f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime}|{self.sample_rate}".encode("utf-8")).hexdigest()
+        return os.path.join(self.store_dir, key + ".pcm")
+
+    def decode(self, video_path, pcm_path):
+        print(f"Decoding audio of {video_path}")
+        try:
+            with profiling.span("ffmpeg.decode", path=video_path):
+                result = subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", video_path, "-vn",
+                                         "-ac", "1", "-ar", str(self.sample_rate), "-f", "s16le", pcm_path + ".tmp"],
+                                        stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        except OSError:
+            return False
+        if result.returncode != 0:
+            print(result.stderr.decode("utf-8", errors="replace"))
+            return False
+        os.replace(pcm_path + ".tmp", pcm_path)
+        profiling.count("bytes.decoded", os.path.getsize(pcm_path))
+        return True
+
+    def samples(self, video_path):
+        """
+        The source's samples as a numpy array (numpy installed) or a read-only mmap of the bytes,
+        None if it can't be decoded.
+        """
+        if video_path not in self.maps:
+            pcm_path = self.path(video_path)
+            if not os.path.exists(pcm_path) and not self.decode(video_path, pcm_path):
+                return None
+            profiling.count("sources.opened")
+            if os.path.getsize(pcm_path) == 0:
+                self.maps[video_path] = b""
+            elif numpy is not None:
+                self.maps[video_path] = numpy.memmap(pcm_path, dtype="<i2", mode="r")
+            else:
+                with open(pcm_path, "rb") as f:
+                    self.maps[video_path] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self.maps[video_path]
+
+
+def crossfade_pieces(pieces, fade):
+    """
+    Join PCM pieces (numpy int16 arrays or bytes), overlapping consecutive pieces by fade samples
+    with linear fades. Returns the joined little endian 16 bit bytes.
+    """
+    if not pieces:
+        return b""
+    # a fade can't be longer than half the shortest piece
+    fade = min(fade, min(len(piece) if hasattr(piece, "dtype") else len(piece) // 2 for piece in pieces) // 2)
+
+    if numpy is not None:
+        if fade == 0:
+            return numpy.concatenate(pieces).astype("<i2").tobytes()
+        ramp = numpy.linspace(0.0, 1.0, fade, endpoint=False, dtype=numpy.float32)
+        out = numpy.zeros(sum(len(piece) for piece in pieces) - fade * (len(pieces) - 1), dtype=numpy.float32)
+        position = 0
+        for idx, piece in enumerate(pieces):
+            piece = piece.astype(numpy.float32)
+            if idx > 0:
+                piece[:fade] *= ramp
+            if idx < len(pieces) - 1:
+                piece[-fade:] *= 1.0 - ramp
+            out[position:position + len(piece)] += piece
+            position += len(piece) - fade
+        return numpy.clip(out, -32768, 32767).astype("<i2").tobytes()
+
+    # without numpy only the overlaps are mixed sample by sample, the rest is copied as bytes
+    out = bytearray()
+    fade_bytes = 2 * fade
+    for idx, piece in enumerate(pieces):
+        piece = bytes(piece)
+        if idx == 0 or fade == 0:
+            out += piece
+            continue
+        tail = array.array("h", out[-fade_bytes:])
+        head = array.array("h", piece[:fade_bytes])
+        if sys.byteorder == "big":
+            tail.byteswap()
+            head.byteswap()
+        mixed = array.array("h", (max(-32768, min(32767, int(a * (1.0 - n / fade) + b * n / fade)))
+                                  for n, (a, b) in enumerate(zip(tail, head))))
+        if sys.byteorder == "big":
+            mixed.byteswap()
+        out[-fade_bytes:] = mixed.tobytes()
+        out += piece[fade_bytes:]
+    return bytes(out)
+
+
+def assemble_audio(media_library, segments, output_filename, crossfade_ms=DEFAULT_CROSSFADE_MS):
+    """
+    Write the segments as a mono WAV from the PCM store instead of rendering a video,
+    returns False if a source's audio couldn't be decoded.
+    """
+    profiling.count("segments", len(segments))
+    store = PcmStore(os.path.join(data_dir, "pcm_store"))
+    rate = store.sample_rate
+    sources = media_library.word_library["sources"]
+
+    pieces = []
+    for segment in segments:
+        video_path = sources[segment["src"]]
+        samples = store.samples(video_path)
+        if samples is None:
+            print(f"Could not decode the audio of {video_path}")
+            return False
+        start, end = int(segment["A"] * rate), int(segment["B"] * rate)
+        piece = samples[start:end] if hasattr(samples, "dtype") else samples[2 * start:2 * end]
+        if len(piece):
+            pieces.append(piece)
+
+    if not pieces:
+        print("No audio to write")
+        return False
+
+    fade = int(crossfade_ms * rate / 1000)
+
+    with wave.open(output_filename, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        with profiling.span("audio.crossfade", pieces=len(pieces)):
+            f.writeframes(crossfade_pieces(pieces, fade))
+    return True
 
 
 # all instances of "word" are output into a video
-def create_word_instances_video(word_segment_library, word, output_filename):
+def create_word_instances_video(word_segment_library, word, output_filename, cache=None, assembler="moviepy", jobs=None,
+                                max_readers=None):
     word_library = word_segment_library.word_library    
 
-    if word in word_library:
-        segments = word_library[word]
-        assemble_video(word_segment_library, segments, output_filename)
+    if word_key(word) in word_library:
+        segments = word_library[word_key(word)]
+        assemble_video(word_segment_library, segments, output_filename, cache, assembler=assembler, jobs=jobs, max_readers=max_readers)
         print(f"Video with all instances of '{word}' saved to {output_filename}")
     else:
         print(f"Word '{word}' not found in the library")
 
 
+# ------------------------------
+# batch rendering, many outputs from one library load
+
+def read_batch_file(batch_path):
+    """
+    Read a batch file, one item per line: either a plain sentence, or a JSON object with
+    "sentence" or "wordslist" and an optional "output" filename. Blank lines and lines
+    starting with # are skipped. Raises ValueError naming the file and line of an invalid item.
+    """
+    base_name = os.path.splitext(os.path.basename(batch_path))[0]
+    items = []
+    with open(batch_path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+
+            if line.startswith("{"):
+                try:
+                    item = json.loads(line)
+                except ValueError as e:
+                    raise ValueError(f"{batch_path}:{line_number}: invalid JSON ({e})")
+                if not isinstance(item, dict) or ("sentence" not in item and "wordslist" not in item):
+                    raise ValueError(f"{batch_path}:{line_number}: batch item needs a 'sentence' or 'wordslist': {line}")
+            else:
+                item = {"sentence": line}
+
+            item.setdefault("output", f"{base_name}_{len(items) + 1:03d}.mp4")
+            items.append(item)
+    return items
+
+
+# per worker process state for batch renders, open sources are kept between items
+batch_library = None
+batch_sources = None
+batch_cache = None
+batch_options = None  # assembler options passed on to assemble_video()
+
+def init_batch_worker(sources, cache_settings, options=None):
+    global batch_library, batch_sources, batch_cache, batch_options
+    batch_library = WordSegmentLibrary(None)
+    batch_library.word_library = {"sources": sources}
+    batch_sources = {}
+    batch_cache = SegmentCache(*cache_settings) if cache_settings else None
+    batch_options = options or {}
+
+def render_batch_item(task):
+    idx, segments, output_filename = task
+    start = time.monotonic()
+    try:
+        with profiling.span("batch.item", output=output_filename):
+            assemble_video(batch_library, segments, output_filename, batch_cache, batch_sources, **batch_options)
+        error = None
+    except Exception as e:
+        error = str(e) or type(e).__name__
+    return idx, error, time.monotonic() - start
+
+
+def run_batch(word_segment_library, batch_path, jobs=1, cache=None, assembler="moviepy", max_readers=None):
+    """
+    Resolve every item of a batch file against the library, render them with a pool of
+    jobs worker processes (each keeping its sources open between items) and write a
+    per-item report next to the batch file. The workers share the segment cache, which
+    SegmentCache keeps consistent with file locks. Items are put together by assembler,
+    except that the pool workers can't start the parallel assembler's processes, they
+    use moviepy instead. Returns False if the batch file can't be read.
+    """
+    try:
+        items = read_batch_file(batch_path)
+    except (OSError, ValueError) as e:
+        print(f"Could not read batch file: {e}")
+        return False
+    report = []
+    tasks = []
+
+    for idx, item in enumerate(items):
+        start = time.monotonic()
+        if "sentence" in item:
+            segments = word_segment_library.creator(item["sentence"])
+        else:
+            segments = word_segment_library.creator_from_words_list(item["wordslist"])
+
+        report.append({
+            "item": idx + 1,
+            "input": item.get("sentence", item.get("wordslist")),
+            "output": item["output"],
+            "segments": len(segments),
+            "status": "empty" if not segments else "pending",
+            "resolve_seconds": round(time.monotonic() - start, 4),
+            "render_seconds": 0.0,
+        })
+        if segments:
+            tasks.append((idx, segments, item["output"]))
+
+    sources = word_segment_library.word_library["sources"]
+    cache_settings = (cache.cache_dir, cache.max_bytes) if cache is not None else None
+    if cache_settings and fcntl is None and jobs > 1 and len(tasks) > 1:
+        # the workers share the cache through file locks, without them they'd overwrite each other's index
+        print("The segment cache can't be shared between batch workers on this platform, rendering without it")
+        cache_settings = None
+    options = {"assembler": assembler, "max_readers": max_readers}
+    batch_start = time.monotonic()
+
+    def record(result):
+        idx, error, seconds = result
+        report[idx]["status"] = "failed" if error else "ok"
+        report[idx]["render_seconds"] = round(seconds, 2)
+        if error:
+            report[idx]["error"] = error
+        print(f"[{idx + 1}/{len(items)}] {report[idx]['output']}: {report[idx]['status']} ({seconds:.1f}s)")
+
+    if jobs <= 1 or len(tasks) <= 1:
+        init_batch_worker(sources, cache_settings, options)
+        for task in tasks:
+            record(render_batch_item(task))
+        for source in batch_sources.values():
+            source.close()
+    else:
+        if assembler == "parallel":
+            print("The batch items are rendered in parallel already, using the moviepy assembler for each item")
+            options["assembler"] = "moviepy"
+        with multiprocessing.Pool(min(jobs, len(tasks)), initializer=init_batch_worker, initargs=(sources, cache_settings, options)) as pool:
+            for result in pool.imap_unordered(render_batch_item, tasks, chunksize=1):
+                record(result)
+
+    report_path = os.path.splitext(batch_path)[0] + "_report.json"
+    with open(report_path, "w") as f:
+        json.dump({"items": report, "wall_seconds": round(time.monotonic() - batch_start, 2)}, f, indent=2)
+
+    rendered = sum(1 for entry in report if entry["status"] == "ok")
+    print(f"\nBatch done: {rendered} of {len(items)} items rendered in {time.monotonic() - batch_start:.1f}s")
+    for entry in report:
+        print(f"  {entry['item']:>4} {entry['status']:<7} {entry['segments']:>5} segments {entry['render_seconds']:>8.1f}s  {entry['output']}")
+    print(f"Report saved to {report_path}")
+
+
+# ------------------------------
+# query/render server, keeps libraries and their indexes loaded between requests
+
+DEFAULT_SERVER_PORT = 8765
+
+
+def render_segments(task):
+    """
+    Render worker for the server: task is (sources, segments, output_filename, cache_settings,
+    assemble_video() options).
+    """
+    sources, segments, output_filename, cache_settings, options = task
+    library = WordSegmentLibrary(None)
+    library.word_library = {"sources": sources}
+    cache = SegmentCache(*cache_settings) if cache_settings else None
+    assemble_video(library, segments, output_filename, cache, **options)
+    return output_filename
+
+
+class LibraryPool:
+    """
+    Loaded libraries by path, reloaded when the library file changes on disk.
+    """
+    def __init__(self):
+        self.libraries = {}  # path -> (signature, WordSegmentLibrary)
+        self.lock = threading.Lock()
+
+    def get(self, label, library_format):
+        if library_format not in LIBRARY_FORMATS:
+            raise ValueError(f"Unknown library format {library_format!r}")
+        if label is not None and (not isinstance(label, str) or os.path.basename(label) != label or label in ("", ".", "..")):
+            raise ValueError(f"Invalid label {label!r}")
+        path = library_path(label, library_format)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No library for label {label!r}")
+        signature = FuzzyWordIndex.library_signature(path)
+
+        with self.lock:
+            loaded = self.libraries.get(path)
+            if loaded is not None and loaded[0] == signature:
+                return loaded[1]
+
+            library = WordSegmentLibrary(path)
+            library.load_word_library()
+            library.get_fuzzy_index()  # warm the alternatives index now rather than on the first request
+            self.libraries[path] = (signature, library)
+            print(f"{'Reloaded' if loaded else 'Loaded'} word library: {path}")
+            return library
+
+
+class ChopItUpRequestHandler(BaseHTTPRequestHandler):
+    """
+    JSON over HTTP: POST /check, /create, /wordslist, /words, /stats with a JSON body
+    holding "label", "format" and the request's arguments, GET /status.
+    With a token, requests have to carry it as "Authorization: Bearer <token>".
+    Rendered files are only written under the server's output root.
+    """
+
+    def send_json(self, status, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if verbose == True:
+            super().log_message(format, *args)
+
+    def authorized(self):
+        if self.server.token is None:
+            return True
+        given = self.headers.get("Authorization", "")
+        if hmac.compare_digest(given.encode("utf-8"), f"Bearer {self.server.token}".encode("utf-8")):
+            return True
+        self.send_json(401, {"error": "Missing or wrong token"})
+        return False
+
+    def do_GET(self):
+        if not self.authorized():
+            return
+        if self.path != "/status":
+            self.send_json(404, {"error": f"Unknown request {self.path}"})
+            return
+        self.send_json(200, {"libraries": sorted(self.server.libraries.libraries), "jobs": self.server.jobs})
+
+    def do_POST(self):
+        if not self.authorized():
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            handler = getattr(self, "handle_" + self.path.strip("/"), None)
+            if handler is None:
+                self.send_json(404, {"error": f"Unknown request {self.path}"})
+                return
+            library = self.server.libraries.get(request.get("label"), request.get("format", "json"))
+            self.send_json(200, handler(library, request))
+        except (ValueError, PermissionError, FileNotFoundError) as e:
+            self.send_json(403 if isinstance(e, PermissionError) else 400, {"error": str(e) or type(e).__name__})
+        except Exception as e:
+            self.send_json(500, {"error": str(e) or type(e).__name__})
+
+    def output_path(self, request, default_filename):
+        """
+        Where to write a render: a relative output name is taken relative to the client's
+        working directory if that is inside the output root, otherwise to the output root.
+        """
+        output = request.get("output") or default_filename
+        if not isinstance(output, str) or os.path.isabs(output) or ".." in output.replace("\\", "/").split("/"):
+            raise PermissionError(f"Output {output!r} has to be a relative path without '..'")
+
+        root = self.server.output_root
+        base = os.path.realpath(request.get("cwd") or root)
+        if os.path.commonpath([root, base]) != root:
+            base = root
+        path = os.path.realpath(os.path.join(base, output))
+        if os.path.commonpath([root, path]) != root:
+            raise PermissionError(f"Output {output!r} is outside the server's output root")
+        return path
+
+    def render(self, library, segments, output_filename):
+        if not segments:
+            return {"segments": [], "output": None}
+        task = (library.word_library["sources"], segments, output_filename, self.server.cache_settings, self.server.render_options)
+        start = time.monotonic()
+        self.server.executor.submit(render_segments, task).result()
+        return {"segments": segments, "output": output_filename, "render_seconds": round(time.monotonic() - start, 2)}
+
+    def handle_check(self, library, request):
+        sentence = request["sentence"]
+        available_words = library.check_string(sentence)
+        found = {word for word, _ in available_words}
+        words = sentence.replace("?", "").replace("!", "").lower().split()
+        return {
+            "available": available_words,
+            "missing": [word for word in words if word not in found],
+            "suggestion": " ".join(alternative for _, alternative in available_words),
+        }
+
+    def handle_stats(self, library, request):
+        return library.library_stats_data(request.get("word"), details=request.get("details", False))
+
+    def handle_create(self, library, request):
+        if request.get("locality") or request.get("plan"):
+            plan = library.plan_segments(request["sentence"], phrases=request.get("phrases", True))
+            if request.get("plan"):
+                return {"plan": plan}
+            segments = plan["segments"]
+        else:
+            segments = library.creator(request["sentence"], phrases=request.get("phrases", True))
+        return self.render(library, segments, self.output_path(request, "output_video.mp4"))
+
+    def handle_wordslist(self, library, request):
+        segments = library.creator_from_words_list(request["wordslist"])
+        return self.render(library, segments, self.output_path(request, "output_video.mp4"))
+
+    def handle_words(self, library, request):
+        word = request["word"].lower()
+        segments = library.get_word_occurrences(word)
+        sanitized_word = "".join(c for c in word if c.isalnum() or c == " ")
+        return self.render(library, segments, self.output_path(request, f"{len(segments)}-{sanitized_word}-words.mp4"))
+
+
+def is_loopback(host):
+    """
+    True if every address host resolves to is a loopback address.
+    """
+    try:
+        return all(ipaddress.ip_address(info[4][0]).is_loopback for info in socket.getaddrinfo(host, None))
+    except (socket.gaierror, ValueError):
+        return False
+
+
+def serve(host, port, jobs=1, cache=None, token=None, output_root=None, assembler="moviepy", max_readers=None):
+    """
+    Run the query/render server until interrupted. Renders are written under output_root
+    (default: the current directory) and put together by assembler, the parallel one can't
+    run inside the render workers, those use moviepy instead. Listening on anything but a
+    loopback address needs a token, which requests then have to carry.
+    """
+    if token is None and not is_loopback(host):
+        print(f"Refusing to listen on {host} without --token, use a loopback address such as 127.0.0.1 or set a token")
+        return False
+
+    server = ThreadingHTTPServer((host, port), ChopItUpRequestHandler)
+    server.libraries = LibraryPool()
+    server.token = token
+    server.output_root = os.path.realpath(output_root or os.getcwd())
+    server.jobs = jobs
+    if assembler == "parallel":
+        print("Requests are rendered in parallel already, using the moviepy assembler for each render")
+        assembler = "moviepy"
+    server.render_options = {"assembler": assembler, "max_readers": max_readers}
+    server.cache_settings = (cache.cache_dir, cache.max_bytes) if cache is not None else None
+    server.executor = ProcessPoolExecutor(max_workers=jobs)
+
+    print(f"ChopItUp server listening on http://{host}:{port} with {jobs} render worker(s), writing under {server.output_root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.executor.shutdown()
+
+
+def server_request(server_url, request_name, request, token=None):
+    """
+    Send a request to a running --serve instance and return its JSON reply.
+    """
+    data = json.dumps(request).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if token is not None:
+        headers["Authorization"] = f"Bearer {token}"
+    http_request = urllib.request.Request(server_url.rstrip("/") + "/" + request_name, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(http_request) as response:
+            return json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return json.loads(e.read() or b"{}")
+
+
+def run_client(args):
+    """
+    Thin client: forward the CLI request to the server given with --server.
+    """
+    request = {"label": args.label, "format": args.format, "cwd": os.getcwd()}
+    output = args.output
+
+    if args.stats is not None:
+        request_name = "stats"
+        request.update(word=args.stats if isinstance(args.stats, str) else None, details=verbose)
+    elif args.words:
+        request_name = "words"
+        request.update(word=args.words, output=output)
+    elif args.create:
+        request_name = "create"
+        request.update(sentence=args.create, output=output, phrases=not args.no_phrases,
+                       locality=args.locality, plan=args.plan)
+    elif args.wordslist:
+        request_name = "wordslist"
+        request.update(wordslist=args.wordslist, output=output)
+    elif args.check_string:
+        request_name = "check"
+        request.update(sentence=args.check_string)
+        print(f"Checking string: {args.check_string}")
+    else:
+        print("Nothing to send to the server (use --check_string, --create, --wordslist, --words or --stats)")
+        return
+
+    reply = server_request(args.server, request_name, request, args.token)
+    if "error" in reply:
+        print(f"Server error: {reply['error']}")
+        exit(1)
+
+    if request_name == "stats":
+        if args.json:
+            print(json.dumps(reply, indent=2))
+        else:
+            print_library_stats(reply)
+    elif request_name == "check":
+        for word, alternative in reply["available"]:
+            if word != alternative:
+                print(f"Alternative used for '{word}': '{alternative}'")
+        for word in reply["missing"]:
+            print(f"Word '{word}' not found in the library, and no suitable alternative found")
+        if reply["suggestion"]:
+            if reply["missing"] or any(word != alternative for word, alternative in reply["available"]):
+                print(f"\nWe don't have all those words, how about this: {reply['suggestion']}")
+            else:
+                print(f"\nAll words were found for string: {reply['suggestion']}")
+    elif "plan" in reply:
+        plan = reply["plan"]
+        print(f"Plan: {len(plan['segments'])} segments from {len(plan['sources'])} source(s), estimated cost {plan['cost']}")
+        for segment in plan["segments"]:
+            print(segment)
+    elif reply["output"]:
+        print(f"Video with {len(reply['segments'])} segments saved to {reply['output']} ({reply['render_seconds']}s)")
+    else:
+        print("No segments found, nothing rendered")
+
+
+# ------------------------------
+# watch folder ingest: new or changed media in a directory are transcribed by a pool of worker
+# processes (each holding a recognition model) and their .rec files merged into the library.
+# a file is queued once its size and mtime have held still for settle_seconds, and at most
+# max_queue files are handed to the pool at a time, the rest wait their turn.
+
+DEFAULT_SETTLE_SECONDS = 5.0
+DEFAULT_POLL_INTERVAL = 2.0
+
+class MediaWatcher:
+    """
+    Finds media files in a directory that are new or changed and have finished being written.
+    Uses inotify (inotify_simple) when it is installed, otherwise lists the directory every poll_interval.
+    """
+
+    def __init__(self, watch_dir, extensions, settle_seconds=DEFAULT_SETTLE_SECONDS, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.watch_dir = watch_dir
+        self.extensions = tuple(extensions)
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.known = {}     # path -> (size, mtime) when it was last reported
+        self.pending = {}   # path -> (size, mtime, time they were last seen to change)
+        self.rescan = True
+        self.inotify = None
+        if inotify_simple is not None:
+            flags = inotify_simple.flags
+            self.inotify = inotify_simple.INotify()
+            self.inotify.add_watch(watch_dir, flags.CREATE | flags.MODIFY | flags.CLOSE_WRITE | flags.MOVED_TO | flags.ATTRIB)
+
+    def is_media(self, name):
+        return name.lower().endswith(self.extensions)
+
+    def check(self, path, now):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(path, None)
+            return
+        signature = (stat.st_size, stat.st_mtime)
+        if self.known.get(path) == signature:
+            self.pending.pop(path, None)
+        elif path not in self.pending or self.pending[path][:2] != signature:
+            self.pending[path] = signature + (now,)
+
+    def wait(self):
+        """
+        Wait up to poll_interval for changes, returns the paths that have settled since the last call.
+        """
+        if self.inotify is not None and not self.rescan:
+            paths = set()
+            for event in self.inotify.read(timeout=int(self.poll_interval * 1000)):
+                if event.mask & inotify_simple.flags.Q_OVERFLOW:
+                    self.rescan = True
+                elif event.name and self.is_media(event.name):
+                    paths.add(os.path.join(self.watch_dir, event.name))
+        else:
+            if not self.rescan:
+                time.sleep(self.poll_interval)
+            paths = {os.path.join(self.watch_dir, name) for name in os.listdir(self.watch_dir) if self.is_media(name)}
+            # with inotify the directory is only listed at the start and after the event queue overflowed
+            self.rescan = self.inotify is None
+
+        now = time.monotonic()
+        for path in paths | set(self.pending):
+            self.check(path, now)
+
+        ready = sorted(path for path, (_, _, since) in self.pending.items() if now - since >= self.settle_seconds)
+        for path in ready:
+            self.known[path] = self.pending.pop(path)[:2]
+        return ready
+
+
+def write_watch_status(status_path, status):
+    temp_path = status_path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(status, f, indent=1)
+    os.replace(temp_path, status_path)
+
+
+def watch(word_segment_library, watch_dir, jobs=1, max_queue=None, settle_seconds=DEFAULT_SETTLE_SECONDS,
+          poll_interval=DEFAULT_POLL_INTERVAL, status_path=None):
+    """
+    Transcribe media that shows up in watch_dir and merge it into the library, until interrupted.
+    Progress is written to status_path (default: next to the library) on every pass.
+    """
+    # loads vosk and moviepy, only needed here
+    import video_to_transcript
+
+    watch_dir = os.path.abspath(watch_dir)
+    jobs = max(1, jobs)
+    max_queue = max(jobs, max_queue or 2 * jobs)
+    status_path = status_path or word_segment_library.word_library_path + ".watch.json"
+    model_path = video_to_transcript.get_model_path(data_dir)
+    watcher = MediaWatcher(watch_dir, video_to_transcript.VIDEO_EXTENSIONS, settle_seconds, poll_interval)
+
+    # media that already has a complete .rec (newer than the media) is only merged, if it isn't yet
+    existing = []
+    for name in sorted(os.listdir(watch_dir)):
+        path = os.path.join(watch_dir, name)
+        rec_file = os.path.splitext(path)[0] + ".rec"
+        if watcher.is_media(name) and video_to_transcript.rec_is_complete(rec_file) and os.path.getmtime(rec_file) >= os.path.getmtime(path):
+            stat = os.stat(path)
+            watcher.known[path] = (stat.st_size, stat.st_mtime)
+            existing.append(rec_file)
+    if existing:
+        word_segment_library.librarian(rec_files=existing)
+
+    waiting = deque()   # (path, time it was found)
+    running = {}        # path -> (AsyncResult, time it was found)
+    totals = {"transcribed": 0, "failed": 0, "merged": 0}
+    last_merge = None
+    last_merge_lag = None
+
+    mode = "inotify" if watcher.inotify is not None else "polling"
+    print(f"Watching {watch_dir} ({mode}) with {jobs} transcription worker(s), press Ctrl+C to stop")
+    pool = multiprocessing.Pool(jobs, initializer=video_to_transcript.init_worker, initargs=(model_path,))
+    try:
+        while True:
+            for path in watcher.wait():
+                if all(path != waiting_path for waiting_path, _ in waiting):
+                    print(f"Queued {path}")
+                    waiting.append((path, time.time()))
+
+            # only hand the pool as much as it can work through, a file changed while it is
+            # being transcribed goes again once that run is done
+            while waiting and len(running) < max_queue and waiting[0][0] not in running:
+                path, found = waiting.popleft()
+                task = (model_path, path, {})
+                running[path] = (pool.apply_async(video_to_transcript.transcribe_worker, (task,)), found)
+
+            merge = []
+            merged_found = []
+            for path in [path for path, (result, _) in running.items() if result.ready()]:
+                result, found = running.pop(path)
+                _, audio_seconds, wall_seconds, error = result.get()
+                if error:
+                    totals["failed"] += 1
+                    print(f"{path}: failed - {error}")
+                    continue
+                totals["transcribed"] += 1
+                print(video_to_transcript.format_summary(path, audio_seconds, wall_seconds))
+                merge.append(os.path.splitext(path)[0] + ".rec")
+                merged_found.append(found)
+
+            if merge:
+                with profiling.span("watch.merge", files=len(merge)):
+                    word_segment_library.librarian(rec_files=merge)
+                totals["merged"] += len(merge)
+                last_merge = time.time()
+                last_merge_lag = round(last_merge - min(merged_found), 1)
+
+            now = time.time()
+            outstanding = [found for _, found in waiting] + [found for _, found in running.values()]
+            write_watch_status(status_path, dict(totals, **{
+                "watching": watch_dir,
+                "library": word_segment_library.word_library_path,
+                "mode": mode,
+                "updated": now,
+                "settling": len(watcher.pending),
+                "waiting": len(waiting),
+                "transcribing": len(running),
+                "queue_depth": len(waiting) + len(running),
+                "max_queue": max_queue,
+                # how long the oldest file not yet in the library has been waiting
+                "lag_seconds": round(now - min(outstanding), 1) if outstanding else 0.0,
+                "last_merge": last_merge,
+                "last_merge_lag_seconds": last_merge_lag,
+            }))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.terminate()
+        pool.join()
+
+
 # Main 
 def main(args):
 
@@ -278,25 +2923,71 @@ def main(args):
         verbose = True
         print("Verbose output is enabled.")
 
-    if args.label:
-        label = args.label
-        word_library_path = os.path.join(data_dir, f"{label}_library.json")
+    if args.profile:
+        profiling.enable(args.profile, args.profile_format)
+
+    if args.server:
+        run_client(args)
+        exit(0)
+
+    cache = None
+    if args.cache or args.cache_stats:
+        cache = SegmentCache(os.path.join(data_dir, "segment_cache"), args.cache_size * 1024 * 1024)
+
+    if args.cache_stats:
+        cache.print_stats()
+        exit(0)
+
+    if is_multi_label(args.label) and not args.serve:
+        word_library_paths = library_paths(args.label, args.format)
+        if not word_library_paths:
+            print(f"No libraries found for --label {args.label}")
+            exit(1)
+        if args.generate or args.convert or args.watch:
+            print("--generate, --convert and --watch work on one --label at a time")
+            exit(1)
+        if not args.json:
+            print(f"Using word libraries: {', '.join(word_library_paths)}")
+        word_library_path = None
+        word_segment_library = FederatedSegmentLibrary(word_library_paths)
+        word_segment_library.load_word_library()
     else:
-        word_library_path = os.path.join(data_dir, "word_library.json")
-    print(f"Using word library: {word_library_path}")
+        word_library_path = library_path(args.label, args.format)
+        if not args.json:
+            print(f"Using word library: {word_library_path}")
+        word_segment_library = None
+
+    if args.serve:
+        if serve(args.host, args.port, args.jobs or 1, cache, args.token, args.output_root, args.assembler, args.max_readers) is False:
+            exit(1)
+        exit(0)
+
+    if args.convert:
+        source_format = args.convert if isinstance(args.convert, str) else ("bin" if args.format == "json" else "json")
+        convert_library(library_path(args.label, source_format), word_library_path)
+        exit(0)
 
-    word_segment_library = WordSegmentLibrary(word_library_path)
-    word_segment_library.load_word_library()
+    if word_segment_library is None:
+        word_segment_library = WordSegmentLibrary(word_library_path)
 
     if args.generate:
-        word_segment_library.librarian(args.media)
+        with profiling.span("library.generate", media=args.media):
+            word_segment_library.librarian(args.media, jobs=args.jobs or 1)
+        exit(0)
+
+    if args.watch:
+        watch(word_segment_library, args.watch, args.jobs or 1, args.max_queue, args.settle, args.poll_interval, args.watch_status)
         exit(0)
 
     if args.stats is not None:
-        word_segment_library.library_stats(word=args.stats if isinstance(args.stats, str) else None)
+        # answered from the stats kept next to the library, which is only loaded if they are out of date
+        word_segment_library.library_stats(word=args.stats if isinstance(args.stats, str) else None, json_output=args.json)
         exit(0)
 
-    if not os.path.exists(word_library_path):
+    if word_segment_library.word_library is None:
+        word_segment_library.load_word_library()
+
+    if word_library_path and not os.path.exists(word_library_path):
         print(f"Generating word library {word_library_path} from .rec files directory '{args.media}'...")
         word_segment_library.librarian(args.media)
 
@@ -305,39 +2996,70 @@ def main(args):
         sanitized_word = "".join(c for c in word if c.isalnum() or c == " ")
         occurrences = word_segment_library.get_word_occurrences(word)
         count = len(occurrences)
+        if args.audio_only:
+            output_filename = args.output or f"{count}-{sanitized_word}-words.wav"
+            if occurrences and assemble_audio(word_segment_library, occurrences, output_filename, args.crossfade):
+                print(f"Audio with all instances of '{word}' saved to {output_filename}")
+            elif not occurrences:
+                print(f"Word '{word}' not found in the library")
+            exit(0)
         output_filename = f"{count}-{sanitized_word}-words.mp4"
-        create_word_instances_video(word_segment_library, word, output_filename)
+        create_word_instances_video(word_segment_library, word, output_filename, cache, args.assembler, args.jobs, args.max_readers)
         exit(0)
 
     if args.create:
         input_sentence = args.create
-        segments = word_segment_library.creator(input_sentence)
+        if args.plan or args.locality:
+            with profiling.span("query.plan"):
+                plan = word_segment_library.plan_segments(input_sentence, phrases=not args.no_phrases)
+            word_segment_library.print_plan(plan)
+            if args.plan:
+                exit(0)
+            segments = plan["segments"]
+        else:
+            with profiling.span("query.creator"):
+                segments = word_segment_library.creator(input_sentence, phrases=not args.no_phrases)
         print("Selected segments:")
         for segment in segments:
             print(segment)
 
+        if args.audio_only:
+            output_filename = args.output or "output_audio.wav"
+            if assemble_audio(word_segment_library, segments, output_filename, args.crossfade):
+                print(f"Audio assembled and saved to {output_filename}")
+            exit(0)
+
         if args.output:
             output_filename = args.output
         else:
             output_filename = "output_video.mp4"
 
-        assemble_video(word_segment_library, segments, output_filename)
+        assemble_video(word_segment_library, segments, output_filename, cache, assembler=args.assembler, jobs=args.jobs,
+                       max_readers=args.max_readers)
         print(f"Video assembled and saved to {output_filename}")
         exit(0)
 
     if args.wordslist:
         input_words_list = args.wordslist
-        segments = word_segment_library.creator_from_words_list(input_words_list)
+        with profiling.span("query.wordslist"):
+            segments = word_segment_library.creator_from_words_list(input_words_list)
         print("Selected segments:")
         for segment in segments:
             print(segment)
 
+        if args.audio_only:
+            output_filename = args.output or "output_audio.wav"
+            if assemble_audio(word_segment_library, segments, output_filename, args.crossfade):
+                print(f"Audio assembled and saved to {output_filename}")
+            exit(0)
+
         if args.output:
             output_filename = args.output
         else:
             output_filename = "output_video.mp4"
 
-        assemble_video(word_segment_library, segments, output_filename)
+        assemble_video(word_segment_library, segments, output_filename, cache, assembler=args.assembler, jobs=args.jobs,
+                       max_readers=args.max_readers)
         print(f"Video assembled and saved to {output_filename}")
         exit(0)
 
@@ -347,24 +3069,66 @@ def main(args):
         word_segment_library.check_string(input_sentence)
         exit(0)
 
+    if args.batch:
+        if run_batch(word_segment_library, args.batch, args.jobs or 1, cache, args.assembler, args.max_readers) is False:
+            exit(1)
+        exit(0)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="ChopItUp Media Library Tool")
     parser.add_argument("--generate", action="store_true", help="Generate/update word library from .rec transcript files")
     parser.add_argument("--media", metavar="RECPATH", type=str, default=".", help="Specify the path to .rec files (for --generate, default: current directory)")
-
-    parser.add_argument("--label", metavar="LABEL", type=str, help="Specify which library to work with (default: 'word')")
+    parser.add_argument("--watch", metavar="DIR", type=str, help="Keep watching DIR, transcribing new or changed videos with --jobs workers and merging them into the library")
+    parser.add_argument("--settle", metavar="SECONDS", type=float, default=DEFAULT_SETTLE_SECONDS, help=f"For --watch, how long a file's size and mtime have to stay the same before it is transcribed (default: {DEFAULT_SETTLE_SECONDS})")
+    parser.add_argument("--poll-interval", metavar="SECONDS", type=float, default=DEFAULT_POLL_INTERVAL, help=f"For --watch, seconds between checks for new and settled files (default: {DEFAULT_POLL_INTERVAL})")
+    parser.add_argument("--max-queue", metavar="N", type=int, help="For --watch, most files handed to the transcription workers at once, the rest wait (default: 2 x --jobs)")
+    parser.add_argument("--watch-status", metavar="FILE", type=str, help="For --watch, where to write the queue depth and lag (default: next to the library, <library>.watch.json)")
+
+    parser.add_argument("--label", metavar="LABEL", type=str, help="Specify which library to work with (default: 'word'), several labels (a,b) or glob patterns ('show_*') query the libraries together")
+    parser.add_argument("--format", choices=sorted(LIBRARY_FORMATS), default="json", help="Library file format, 'bin' is a compact memory-mapped format, 'sqlite' is updated in place and can be read during --generate (default: json)")
+    parser.add_argument("--convert", metavar="FROM_FORMAT", nargs="?", const=True, choices=sorted(LIBRARY_FORMATS), help="Convert the library from FROM_FORMAT (default: json, or bin for --format json) into the one selected with --format")
     
     parser.add_argument("--create", metavar="SENTENCE", type=str, help="Create a video using the given input sentence")
+    parser.add_argument("--no-phrases", action="store_true", help="For --create, cut every word separately instead of taking runs of words spoken together in one piece")
+    parser.add_argument("--locality", action="store_true", help="For --create, choose word occurrences that use the fewest source files and shortest seeks")
+    parser.add_argument("--plan", action="store_true", help="For --create, print the --locality segment plan and its estimated cost without rendering")
     parser.add_argument("--words", metavar="WORD", type=str, help="Create a video of all instances of a given word")
     parser.add_argument("--wordslist", metavar="WORDSLIST", type=str, help="Create a video using the given comma-separated list of words")
     parser.add_argument("--output", metavar="FILENAME", type=str, help="Specify the output video filename")
+    parser.add_argument("--assembler", choices=["moviepy", "smartcut", "parallel", "streaming"], default="moviepy", help="How videos are put together: 'smartcut' cuts with ffmpeg, stream-copying whole GOPs, and falls back to moviepy for sources it can't handle, 'parallel' encodes chunks of the output in --jobs processes (default: one per CPU) and joins them, 'streaming' writes each segment to one encoder as it is read, for outputs with very many segments, neither of them works with --cache (default: moviepy)")
+    parser.add_argument("--max-readers", metavar="K", type=int, default=DEFAULT_MAX_READERS, help=f"For --assembler streaming, the most source videos kept open at once (default: {DEFAULT_MAX_READERS})")
+    parser.add_argument("--audio-only", action="store_true", help="For --create, --words and --wordslist, write a WAV preview from decoded source audio instead of rendering a video")
+    parser.add_argument("--crossfade", metavar="MS", type=int, default=DEFAULT_CROSSFADE_MS, help=f"Crossfade between segments of --audio-only previews (default: {DEFAULT_CROSSFADE_MS})")
+    parser.add_argument("--batch", metavar="FILE", type=str, help="Render every sentence in FILE (one per line, or JSON lines with 'sentence' or 'wordslist' and 'output')")
+    parser.add_argument("--jobs", metavar="N", type=int, default=None, help="Number of worker processes for --batch and --serve renders, --watch transcription, --assembler parallel, and for parsing .rec files when --generate builds a new json or bin library (default: 1, one per CPU for --assembler parallel)")
+
+    parser.add_argument("--cache", action="store_true", help="Reuse rendered word segments from the segment cache, and add new ones to it")
+    parser.add_argument("--cache-size", metavar="MB", type=int, default=2048, help="Size cap of the segment cache, least recently used segments are evicted (default: 2048)")
+    parser.add_argument("--cache-stats", action="store_true", help="Display segment cache statistics")
+
+    parser.add_argument("--serve", action="store_true", help="Run a server that keeps libraries loaded and answers check/create/wordslist/words/stats requests")
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address for --serve to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_SERVER_PORT, help=f"Port for --serve (default: {DEFAULT_SERVER_PORT})")
+    parser.add_argument("--token", type=str, default=os.environ.get("CHOPITUP_TOKEN"), help="Token --serve requires on every request and --server sends, needed to --serve on a non-loopback --host (default: $CHOPITUP_TOKEN)")
+    parser.add_argument("--output-root", metavar="DIR", type=str, help="Directory --serve writes renders under, outputs outside it are refused (default: the current directory)")
+    parser.add_argument("--server", metavar="URL", type=str, help=f"Send the request to a running --serve instance, e.g. http://127.0.0.1:{DEFAULT_SERVER_PORT}")
 
     parser.add_argument("--verbose", action="store_true", help="Enable verbose output")
     parser.add_argument("--check_string", metavar="SENTENCE", type=str, help="Check the given string for available words and suggest alternatives")
     parser.add_argument("--stats", nargs='?', const=True, type=str, help="Display statistics, optionally for a specific word", required=False)
+    parser.add_argument("--json", action="store_true", help="Print --stats as JSON")
+    parser.add_argument("--profile", metavar="FILE", type=str, help="Record how long each stage takes (library load, fuzzy matching, opening, cutting and encoding) and write it to FILE on exit")
+    parser.add_argument("--profile-format", choices=["json", "chrome"], default="json", help="--profile output, 'chrome' is the trace event format read by chrome://tracing and Perfetto (default: json)")
 
     args = parser.parse_args()
 
+    if args.jobs is not None and args.jobs < 1:
+        parser.error("--jobs has to be at least 1")
+    if args.crossfade < 0:
+        parser.error("--crossfade can't be negative")
+    if args.cache and args.assembler in ("parallel", "streaming"):
+        parser.error(f"--assembler {args.assembler} doesn't use the segment cache, leave out --cache or use --assembler moviepy")
+
     if not any(vars(args).values()):
         parser.print_help()
     
@@ -0,0 +1,139 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# profiling.py
+# timed spans and counters for --profile in chopitup.py and video_to_transcript.py.
+# when profiling isn't enabled span() hands back a shared do-nothing context manager and
+# count()/add_time() return straight away, so the instrumentation can stay in the code.
+# the results are written as JSON (per-stage totals plus every span) or in the Chrome trace
+# event format, which chrome://tracing and Perfetto open.
+
+import os
+import json
+import time
+import atexit
+import threading
+
+enabled = False
+
+_lock = threading.Lock()
+_start = 0.0
+_events = []    # (name, start, duration, thread id, args)
+_counters = {}  # name -> value
+_timers = {}    # name -> [calls, seconds], for hot loops where a span per call would be too much
+
+
+class Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        duration = time.perf_counter() - self.start
+        with _lock:
+            _events.append((self.name, self.start, duration, threading.get_ident(), self.args))
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+def enable(output_path=None, trace_format="json"):
+    """
+    Start recording, with output_path the results are written there when the program exits.
+    """
+    global enabled, _start
+    enabled = True
+    _start = time.perf_counter()
+    if output_path:
+        atexit.register(write, output_path, trace_format)
+
+
+def span(name, **args):
+    """
+    Context manager timing a stage, args are stored with it (keep them small).
+    """
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, args)
+
+
+def count(name, value=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def add_time(name, seconds):
+    """
+    Add to an aggregated timer, for code that runs too often to record every call.
+    """
+    if not enabled:
+        return
+    with _lock:
+        timer = _timers.setdefault(name, [0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+
+
+def summary():
+    """
+    Calls, total and longest time per span name, plus the timers and counters.
+    """
+    spans = {}
+    for name, _, duration, _, _ in _events:
+        entry = spans.setdefault(name, {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+        entry["count"] += 1
+        entry["total_seconds"] += duration
+        entry["max_seconds"] = max(entry["max_seconds"], duration)
+    for entry in spans.values():
+        entry["total_seconds"] = round(entry["total_seconds"], 6)
+        entry["max_seconds"] = round(entry["max_seconds"], 6)
+    return {
+        "wall_seconds": round(time.perf_counter() - _start, 6),
+        "spans": spans,
+        "timers": {name: {"count": calls, "total_seconds": round(seconds, 6)} for name, (calls, seconds) in _timers.items()},
+        "counters": dict(_counters),
+    }
+
+
+def chrome_trace():
+    pid = os.getpid()
+    events = [{"name": name, "ph": "X", "ts": round((start - _start) * 1e6, 3), "dur": round(duration * 1e6, 3),
+               "pid": pid, "tid": tid, "args": args}
+              for name, start, duration, tid, args in _events]
+    end = round((time.perf_counter() - _start) * 1e6, 3)
+    events.extend({"name": name, "ph": "C", "ts": end, "pid": pid, "tid": 0, "args": {name: value}}
+                  for name, value in _counters.items())
+    totals = summary()
+    return {"traceEvents": events, "displayTimeUnit": "ms",
+            "otherData": {"timers": totals["timers"], "counters": totals["counters"]}}
+
+
+def write(output_path, trace_format="json"):
+    with _lock:
+        if trace_format == "chrome":
+            data = chrome_trace()
+        else:
+            data = summary()
+            data["events"] = [{"name": name, "start": round(start - _start, 6), "duration": round(duration, 6),
+                               "thread": tid, "args": args}
+                              for name, start, duration, tid, args in _events]
+    with open(output_path, "w") as f:
+        json.dump(data, f, indent=1)
+    print(f"Profile saved to {output_path}")
@@ -0,0 +1,230 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# sqlite_library.py
+# SQLite store for the word library, an alternative to rewriting one big JSON file.
+# the database runs in WAL mode so the library can be read while --generate is updating it,
+# and the .rec files of each source are ingested in a single transaction.
+
+import json
+import sqlite3
+import threading
+from collections.abc import Mapping
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sources (id INTEGER PRIMARY KEY, path TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS words (id INTEGER PRIMARY KEY, word TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS occurrences (
+    word_id INTEGER NOT NULL REFERENCES words(id),
+    src INTEGER NOT NULL REFERENCES sources(id),
+    A REAL NOT NULL,
+    B REAL NOT NULL,
+    P INTEGER
+);
+CREATE INDEX IF NOT EXISTS occurrences_word ON occurrences (word_id);
+CREATE INDEX IF NOT EXISTS occurrences_src_a ON occurrences (src, A);
+CREATE TABLE IF NOT EXISTS manifest (
+    rec TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    hash TEXT NOT NULL,
+    media TEXT NOT NULL
+);
+"""
+
+
+def _occurrence(src, start_time, end_time, position):
+    occurrence = {"src": src, "A": start_time, "B": end_time}
+    if position is not None:
+        occurrence["P"] = position
+    return occurrence
+
+
+class SqliteWordLibrary(Mapping):
+    """
+    Dict-like view of a SQLite word library, so WordSegmentLibrary can use it like the loaded
+    JSON library. Per-source and time-ordered lookups are done in SQL by
+    the dedicated methods.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._sources = None
+
+    def close(self):
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+    def query(self, sql, parameters=()):
+        with self.lock:
+            return self.conn.execute(sql, parameters).fetchall()
+
+    # ---- dict-like access
+
+    def sources(self):
+        if self._sources is None:
+            self._sources = [path for (path,) in self.query("SELECT path FROM sources ORDER BY id")]
+        return self._sources
+
+    def manifest(self):
+        return {rec: {"size": size, "mtime": mtime, "hash": content_hash, "media": media}
+                for rec, size, mtime, content_hash, media in self.query("SELECT rec, size, mtime, hash, media FROM manifest")}
+
+    def version(self):
+        rows = self.query("SELECT value FROM meta WHERE key = 'version'")
+        return int(rows[0][0]) if rows else 1
+
+    def generation(self):
+        """
+        Number of updates made to the library, for sidecar files that have to match it.
+        """
+        rows = self.query("SELECT value FROM meta WHERE key = 'generation'")
+        return int(rows[0][0]) if rows else 0
+
+    def __getitem__(self, key):
+        if key == "sources":
+            return self.sources()
+        if key == "manifest":
+            return self.manifest()
+        if key == "version":
+            return self.version()
+
+        rows = self.query("SELECT o.src, o.A, o.B, o.P FROM occurrences o JOIN words w ON w.id = o.word_id "
+                          "WHERE w.word = ? ORDER BY o.rowid", (key,))
+        if not rows:
+            raise KeyError(key)
+        return [_occurrence(*row) for row in rows]
+
+    def __contains__(self, key):
+        if key in ("sources", "manifest", "version"):
+            return True
+        return bool(self.query("SELECT 1 FROM words w WHERE w.word = ? AND EXISTS "
+                               "(SELECT 1 FROM occurrences o WHERE o.word_id = w.id)", (key,)))
+
+    def __iter__(self):
+        yield from ("sources", "manifest", "version")
+        for (word,) in self.query("SELECT word FROM words ORDER BY id"):
+            yield word
+
+    def __len__(self):
+        return 3 + self.query("SELECT COUNT(*) FROM words")[0][0]
+
+    # ---- queries done in SQL
+
+    def source_words(self, media):
+        """
+        The (word, A, B) occurrences of a source, in transcript order.
+        """
+        return self.query("SELECT w.word, o.A, o.B FROM occurrences o JOIN words w ON w.id = o.word_id "
+                          "JOIN sources s ON s.id = o.src WHERE s.path = ? ORDER BY o.P, o.rowid", (media,))
+
+    def occurrences_by_time(self, words):
+        """
+        All occurrences of the given words ordered by start time, ties in the order of words.
+        """
+        if not words:
+            return []
+        values = ", ".join("(?, ?)" for _ in words)
+        parameters = [value for idx, word in enumerate(words) for value in (word, idx)]
+        rows = self.query(f"WITH wanted(word, ord) AS (VALUES {values}) "
+                          "SELECT o.src, o.A, o.B, o.P FROM wanted JOIN words w ON w.word = wanted.word "
+                          "JOIN occurrences o ON o.word_id = w.id ORDER BY o.A, wanted.ord, o.rowid", parameters)
+        return [_occurrence(*row) for row in rows]
+
+    # ---- updates
+
+    def set_version(self, version):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (str(version),))
+
+    def next_generation(self):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('generation', ?)", (str(self.generation() + 1),))
+
+    def source_id(self, media):
+        """
+        Id of a source path, adding it if needed (call inside a transaction).
+        """
+        row = self.conn.execute("SELECT id FROM sources WHERE path = ?", (media,)).fetchone()
+        if row:
+            return row[0]
+        src = self.conn.execute("SELECT COUNT(*) FROM sources").fetchone()[0]
+        self.conn.execute("INSERT INTO sources (id, path) VALUES (?, ?)", (src, media))
+        self._sources = None
+        return src
+
+    def ingest(self, media, recs, removed_recs=()):
+        """
+        Replace the occurrences of source media with the words of recs, a list of
+        (rec_file, manifest entry, [(word, start, end), ...]) holding every .rec file of that
+        source, record the files in the manifest and drop the removed_recs from it, all in one
+        transaction.
+        """
+        with self.lock, self.conn:
+            src = self.source_id(media)
+            self.conn.execute("DELETE FROM occurrences WHERE src = ?", (src,))
+            self.conn.executemany("DELETE FROM manifest WHERE rec = ?", ((rec_file,) for rec_file in removed_recs))
+
+            distinct = list({word for _, _, words in recs for word, _, _ in words})
+            self.conn.executemany("INSERT OR IGNORE INTO words (word) VALUES (?)", ((word,) for word in distinct))
+            word_ids = {}
+            for start in range(0, len(distinct), 500):
+                chunk = distinct[start:start + 500]
+                placeholders = ", ".join("?" for _ in chunk)
+                word_ids.update(self.conn.execute(f"SELECT word, id FROM words WHERE word IN ({placeholders})", chunk).fetchall())
+
+            # positions carry on from one file of the source to the next
+            first_position = 0
+            for rec_file, entry, words in recs:
+                self.conn.executemany("INSERT INTO occurrences (word_id, src, A, B, P) VALUES (?, ?, ?, ?, ?)",
+                                      ((word_ids[word], src, start_time, end_time, position)
+                                       for position, (word, start_time, end_time) in enumerate(words, first_position)))
+                first_position += len(words)
+                self.conn.execute("INSERT OR REPLACE INTO manifest (rec, size, mtime, hash, media) VALUES (?, ?, ?, ?, ?)",
+                                  (rec_file, entry["size"], entry["mtime"], entry["hash"], media))
+            return src
+
+    def update_manifest(self, manifest):
+        """
+        Store size/mtime changes for files that were touched but not modified.
+        """
+        with self.lock, self.conn:
+            self.conn.executemany("UPDATE manifest SET size = ?, mtime = ? WHERE rec = ?",
+                                  ((entry["size"], entry["mtime"], rec) for rec, entry in manifest.items()))
+
+    def prune_words(self):
+        """
+        Remove words that no longer have any occurrences.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM words WHERE NOT EXISTS (SELECT 1 FROM occurrences o WHERE o.word_id = words.id)")
+
+
+def write_sqlite_library(path, word_library, reserved_keys):
+    """
+    Write a dict-like word library into the SQLite library at path, replacing its contents
+    in a single transaction so readers see either the old or the new library.
+    """
+    library = SqliteWordLibrary(path)
+    with library.lock, library.conn:
+        generation = library.generation()
+        for table in ("occurrences", "words", "sources", "manifest", "meta"):
+            library.conn.execute(f"DELETE FROM {table}")
+        library.conn.executemany("INSERT INTO sources (id, path) VALUES (?, ?)", enumerate(word_library["sources"]))
+        library.conn.executemany("INSERT INTO manifest (rec, size, mtime, hash, media) VALUES (?, ?, ?, ?, ?)",
+                                 ((rec, e["size"], e["mtime"], e["hash"], e.get("media", "")) for rec, e in word_library.get("manifest", {}).items()))
+        library.conn.execute("INSERT INTO meta (key, value) VALUES ('version', ?)", (json.dumps(word_library.get("version", 1)),))
+        library.conn.execute("INSERT INTO meta (key, value) VALUES ('generation', ?)", (str(generation + 1),))
+        for word in word_library:
+            if word in reserved_keys:
+                continue
+            word_id = library.conn.execute("INSERT INTO words (word) VALUES (?)", (word,)).lastrowid
+            library.conn.executemany("INSERT INTO occurrences (word_id, src, A, B, P) VALUES (?, ?, ?, ?, ?)",
+                                     ((word_id, o["src"], o["A"], o["B"], o.get("P")) for o in word_library[word]))
+    library.close()
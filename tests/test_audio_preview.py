@@ -0,0 +1,56 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for joining audio preview pieces with crossfades
+
+import os
+import sys
+import array
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+NUMPY = [None, chopitup.numpy] if chopitup.numpy is not None else [None]
+
+
+def pcm(samples):
+    data = array.array("h", samples)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return data.tobytes()
+
+
+def pieces_for(numpy, lengths, value=1000):
+    pieces = [pcm([value] * length) for length in lengths]
+    if numpy is not None:
+        pieces = [numpy.frombuffer(piece, dtype="<i2") for piece in pieces]
+    return pieces
+
+
+@pytest.mark.parametrize("numpy", NUMPY)
+@pytest.mark.parametrize("fade", [0, 1, 10, 40])
+def test_crossfade_keeps_the_total_length(monkeypatch, numpy, fade):
+    monkeypatch.setattr(chopitup, "numpy", numpy)
+    lengths = [100, 250, 80, 300]
+    joined = chopitup.crossfade_pieces(pieces_for(numpy, lengths), fade)
+    assert len(joined) == 2 * (sum(lengths) - fade * (len(lengths) - 1))
+    # equal pieces fade into each other without a dip or a bump
+    assert set(array.array("h", joined)) <= {999, 1000}
+
+
+@pytest.mark.parametrize("numpy", NUMPY)
+def test_crossfade_is_clamped_to_half_the_shortest_piece(monkeypatch, numpy):
+    monkeypatch.setattr(chopitup, "numpy", numpy)
+    lengths = [100, 12, 100]
+    joined = chopitup.crossfade_pieces(pieces_for(numpy, lengths), 1000)
+    assert len(joined) == 2 * (sum(lengths) - 6 * (len(lengths) - 1))
+    assert chopitup.crossfade_pieces([], 10) == b""
+
+
+def test_negative_crossfade_is_rejected():
+    result = subprocess.run([sys.executable, chopitup.__file__, "--crossfade", "-5", "--audio-only"],
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 2
+    assert b"--crossfade can't be negative" in result.stderr
@@ -0,0 +1,34 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for reading --batch files
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+def test_batch_file_items(tmp_path):
+    batch_path = tmp_path / "jobs.txt"
+    batch_path.write_text('# comment\nhello world\n\n{"wordslist": "a.txt", "output": "a.mp4"}\n{"sentence": "good night"}\n')
+    assert chopitup.read_batch_file(str(batch_path)) == [
+        {"sentence": "hello world", "output": "jobs_001.mp4"},
+        {"wordslist": "a.txt", "output": "a.mp4"},
+        {"sentence": "good night", "output": "jobs_003.mp4"},
+    ]
+
+
+@pytest.mark.parametrize("bad_line, message", [('{"sentence": "hello"', "invalid JSON"),
+                                                ('{"output": "a.mp4"}', "needs a 'sentence' or 'wordslist'")])
+def test_invalid_batch_lines_name_the_file_and_line(tmp_path, capsys, bad_line, message):
+    batch_path = tmp_path / "jobs.txt"
+    batch_path.write_text(f"hello world\n\n{bad_line}\n")
+    with pytest.raises(ValueError, match=message) as error:
+        chopitup.read_batch_file(str(batch_path))
+    assert str(error.value).startswith(f"{batch_path}:3: ")
+
+    assert chopitup.run_batch(None, str(batch_path)) is False
+    assert f"{batch_path}:3: " in capsys.readouterr().out
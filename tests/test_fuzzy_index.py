@@ -0,0 +1,97 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for the indexed alternative word lookup against the full vocabulary scan it replaced
+
+import os
+import sys
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+VOCABULARY = ["hello", "help", "helmet", "world", "word", "words", "worlds", "a", "i", "an", "at", "as",
+              "the", "then", "there", "their", "them", "quick", "quack", "brown", "browne", "fox", "box"]
+
+
+def full_scan(vocabulary, word):
+    """
+    get_alternative_word() before the index: the first word with the highest similarity among
+    those with the same first letter and a length within 2.
+    """
+    alternative_word = None
+    highest_similarity = 0
+    for available_word in vocabulary:
+        if word[0] == available_word[0] and abs(len(word) - len(available_word)) <= 2:
+            similarity = SequenceMatcher(None, word, available_word).ratio()
+            if similarity > highest_similarity:
+                highest_similarity = similarity
+                alternative_word = available_word
+    return alternative_word
+
+
+def ranked_scan(vocabulary, word, k):
+    scored = [(-SequenceMatcher(None, word, available_word).ratio(), idx, available_word)
+              for idx, available_word in enumerate(vocabulary)
+              if word[0] == available_word[0] and abs(len(word) - len(available_word)) <= 2]
+    return [(available_word, -negative) for negative, _, available_word in sorted(scored) if negative < 0][:k]
+
+
+def make_index(vocabulary):
+    index = chopitup.FuzzyWordIndex()
+    index.update({"sources": [], **{chopitup.word_key(word): [] for word in vocabulary}}, None)
+    return index
+
+
+def random_vocabulary(seed, size=2000):
+    rng = random.Random(seed)
+    words = {"".join(rng.choice("abcdehilmnorst") for _ in range(rng.randint(1, 9))) for _ in range(size)}
+    return sorted(words, key=lambda word: rng.random())
+
+
+@pytest.mark.parametrize("word", ["helo", "hellp", "wrld", "wordz", "teh", "thier", "qiuck", "brwn", "fx", "bx",
+                                  "a", "i", "o", "ax", "as", "zebra", "x", "hello"])
+def test_best_match_is_the_full_scan_result(word):
+    # o, x and zebra land in empty buckets
+    matches = make_index(VOCABULARY).best_matches(word)
+    expected = full_scan(VOCABULARY, word)
+    assert (matches[0][0] if matches else None) == expected
+
+
+def test_best_matches_on_a_large_vocabulary():
+    vocabulary = random_vocabulary(1)
+    index = make_index(vocabulary)
+    rng = random.Random(2)
+    for _ in range(300):
+        word = "".join(rng.choice("abcdehilmnorstu") for _ in range(rng.randint(1, 10)))
+        matches = index.best_matches(word, 5)
+        assert (matches[0][0] if matches else None) == full_scan(vocabulary, word)
+        assert matches == ranked_scan(vocabulary, word, 5)
+
+
+def test_update_keeps_results_in_line_with_a_changed_vocabulary():
+    index = make_index(VOCABULARY)
+    changed = [word for word in VOCABULARY if word not in ("hello", "there")] + ["hallo", "three"]
+    index.update({"sources": [], **{chopitup.word_key(word): [] for word in changed}}, None)
+    for word in ("helo", "thre", "thee", "hallo"):
+        matches = index.best_matches(word)
+        assert (matches[0][0] if matches else None) == full_scan(changed, word)
+
+
+def test_check_string_substitutes_the_full_scan_choice(tmp_path):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    with open(rec_dir / "a.rec", "w") as f:
+        f.write("media=a.mp4\n")
+        for idx, word in enumerate(VOCABULARY):
+            f.write(f"{word}\t{idx:.2f}\t{idx + 0.5:.2f}\n")
+    library = chopitup.WordSegmentLibrary(str(tmp_path / "library.json"))
+    library.librarian(str(rec_dir))
+    library.load_word_library()
+
+    sentence = "helo wrld teh qiuck brwn fx zebra a"
+    expected = [(word, full_scan(VOCABULARY, word)) for word in sentence.split() if full_scan(VOCABULARY, word)]
+    assert library.check_string(sentence) == expected
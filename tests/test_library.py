@@ -0,0 +1,158 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for building and querying word libraries from .rec transcripts
+
+import os
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+def write_rec(path, media, words):
+    with open(path, "w") as f:
+        f.write(f"media={media}\n")
+        for idx, word in enumerate(words):
+            f.write(f"{word}\t{idx * 0.5:.2f}\t{idx * 0.5 + 0.4:.2f}\n")
+
+
+# words that are also bookkeeping keys, or look like escaped ones
+RESERVED_WORDS = ["version", "sources", "manifest", "=version", "hello"]
+
+
+@pytest.mark.parametrize("library_format", sorted(chopitup.LIBRARY_FORMATS))
+def test_reserved_words_are_ingested_as_words(tmp_path, library_format):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    write_rec(rec_dir / "a.rec", "a.mp4", RESERVED_WORDS)
+    library_path = str(tmp_path / ("library" + chopitup.LIBRARY_FORMATS[library_format]))
+
+    library = chopitup.WordSegmentLibrary(library_path)
+    library.librarian(str(rec_dir))
+    # a second run goes through the manifest, which a spoken "manifest" must not have replaced
+    write_rec(rec_dir / "b.rec", "b.mp4", ["version", "manifest"])
+    library.librarian(str(rec_dir))
+
+    library = chopitup.WordSegmentLibrary(library_path)
+    library.load_word_library()
+    assert library.word_library["sources"] == ["a.mp4", "b.mp4"]
+    assert set(library.word_library["manifest"]) == {str(rec_dir / "a.rec"), str(rec_dir / "b.rec")}
+    assert library.word_library["version"] == chopitup.LIBRARY_VERSION
+
+    for position, word in enumerate(RESERVED_WORDS):
+        occurrences = library.get_word_occurrences(word)
+        assert occurrences[0]["src"] == 0 and occurrences[0]["P"] == position
+    assert len(library.get_word_occurrences("version")) == 2
+    assert library.creator("version sources hello") == [{"src": 0, "A": 0.0, "B": 0.9, "words": 2}, library.get_word_occurrences("hello")[0]]
+    assert [word for word, _ in library.check_string("manifest version")] == ["manifest", "version"]
+    assert library.library_stats_data("version")["occurrences"] == 2
+    assert library.library_stats_data()["unique_words"] == len(RESERVED_WORDS)
+
+
+@pytest.mark.parametrize("library_format", ["json", "bin"])
+def test_streaming_build_matches_librarian(tmp_path, library_format, monkeypatch):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    write_rec(rec_dir / "a.rec", "a.mp4", RESERVED_WORDS + ["hello", "world"])
+    write_rec(rec_dir / "b.rec", "b.mp4", ["world", "sources", "version", "hello"])
+    # a second transcript of the same media
+    write_rec(rec_dir / "c.rec", "a.mp4", ["manifest", "world"])
+    # several batches and merge rounds
+    monkeypatch.setattr(chopitup, "STREAM_BATCH_FILES", 1)
+    monkeypatch.setattr(chopitup, "MERGE_FANIN", 2)
+
+    extension = chopitup.LIBRARY_FORMATS[library_format]
+    serial = chopitup.WordSegmentLibrary(str(tmp_path / ("serial" + extension)))
+    serial.librarian(str(rec_dir))
+    streamed = chopitup.WordSegmentLibrary(str(tmp_path / ("streamed" + extension)))
+    streamed.librarian(str(rec_dir), jobs=2)
+
+    expected = chopitup.read_library(serial.word_library_path)
+    assert chopitup.read_library(streamed.word_library_path) == expected
+    assert expected["version"] == chopitup.LIBRARY_VERSION
+    assert len(expected[chopitup.word_key("version")]) == 2
+    with open(serial.word_library_path + ".stats") as f, open(streamed.word_library_path + ".stats") as g:
+        serial_stats, streamed_stats = json.load(f), json.load(g)
+    assert serial_stats["words"] == streamed_stats["words"]
+    assert serial_stats["sources"] == streamed_stats["sources"]
+
+
+@pytest.mark.parametrize("library_format", sorted(chopitup.LIBRARY_FORMATS))
+def test_phrases_stay_within_a_transcript_and_break_on_pauses(tmp_path, library_format):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    # two transcripts of one media, each would number "good" 0 and "night"/"morning" 1
+    write_rec(rec_dir / "a.rec", "a.mp4", ["good", "morning"])
+    with open(rec_dir / "b.rec", "w") as f:
+        f.write("media=a.mp4\ngood\t100.00\t100.40\nnight\t100.50\t100.90\nsleep\t110.00\t110.40\n")
+    library = chopitup.WordSegmentLibrary(str(tmp_path / ("library" + chopitup.LIBRARY_FORMATS[library_format])))
+    library.librarian(str(rec_dir))
+
+    positions = sorted(o["P"] for word in ("good", "morning", "night", "sleep") for o in library.get_word_occurrences(word))
+    assert positions == list(range(5))
+    for locality in (False, True):
+        segments = library.creator("good night", locality=locality)
+        assert segments == [{"src": 0, "A": 100.0, "B": 100.9, "words": 2}]
+        # consecutive in the transcript, but ten seconds apart
+        segments = library.creator("night sleep", locality=locality)
+        assert [segment["A"] for segment in segments] == [100.5, 110.0]
+        assert all("words" not in segment for segment in segments)
+
+    # two more transcripts covering the same stretch of the media, numbered on from the others
+    write_rec(rec_dir / "c.rec", "a.mp4", ["seven"])
+    write_rec(rec_dir / "d.rec", "a.mp4", ["four", "five"])
+    library.librarian(str(rec_dir))
+    seven = library.get_word_occurrences("seven")[0]
+    four = library.get_word_occurrences("four")[0]
+    assert abs(four["P"] - seven["P"]) == 1
+    for locality in (False, True):
+        segments = library.creator("seven four five", locality=locality)
+        assert segments == [seven, {"src": 0, "A": 0.0, "B": 0.9, "words": 2}]
+
+
+@pytest.mark.parametrize("library_format", sorted(chopitup.LIBRARY_FORMATS))
+def test_removing_a_transcript_keeps_the_other_transcripts_of_its_media(tmp_path, library_format):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    write_rec(rec_dir / "a.rec", "a.mp4", ["hello", "world"])
+    write_rec(rec_dir / "b.rec", "a.mp4", ["goodbye", "world"])
+    write_rec(rec_dir / "c.rec", "a.mp4", ["again"])
+    library = chopitup.WordSegmentLibrary(str(tmp_path / ("library" + chopitup.LIBRARY_FORMATS[library_format])))
+    library.librarian(str(rec_dir))
+
+    os.remove(rec_dir / "b.rec")
+    # and move another one to a different media
+    write_rec(rec_dir / "c.rec", "c.mp4", ["again"])
+    library.librarian(str(rec_dir))
+
+    library = chopitup.WordSegmentLibrary(library.word_library_path)
+    library.load_word_library()
+    assert [o["src"] for o in library.get_word_occurrences("hello")] == [0]
+    assert [o["src"] for o in library.get_word_occurrences("world")] == [0]
+    assert library.get_word_occurrences("goodbye") == []
+    assert [library.word_library["sources"][o["src"]] for o in library.get_word_occurrences("again")] == ["c.mp4"]
+    assert set(library.word_library["manifest"]) == {str(rec_dir / "a.rec"), str(rec_dir / "c.rec")}
+    assert library.library_stats_data()["total_words"] == 3
+
+
+def test_converting_over_an_open_sqlite_library(tmp_path):
+    rec_dir = tmp_path / "recs"
+    rec_dir.mkdir()
+    write_rec(rec_dir / "a.rec", "a.mp4", ["hello", "world"])
+    json_library = chopitup.WordSegmentLibrary(str(tmp_path / "library.json"))
+    json_library.librarian(str(rec_dir))
+    sqlite_path = str(tmp_path / "library.sqlite")
+    chopitup.convert_library(json_library.word_library_path, sqlite_path)
+
+    reader = chopitup.SqliteWordLibrary(sqlite_path)
+    assert len(reader["hello"]) == 1
+    write_rec(rec_dir / "b.rec", "b.mp4", ["hello"])
+    json_library.librarian(str(rec_dir))
+    chopitup.convert_library(json_library.word_library_path, sqlite_path)
+
+    assert len(reader["hello"]) == 2
+    reader.close()
+    assert chopitup.read_library(sqlite_path) == chopitup.read_library(json_library.word_library_path)
@@ -0,0 +1,53 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for sharing the segment cache between processes
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+def add_segment(cache, key, size):
+    """
+    Put a segment in the cache the way render() does, without encoding one.
+    """
+    with open(cache.path(key), "wb") as f:
+        f.write(b"\0" * size)
+    entry = {"size": size, "last_used": time.time(), "params": [160, 120, 25, True]}
+    cache.entries[key] = entry
+    cache.changes[key] = entry
+
+
+def test_saves_from_several_caches_are_merged(tmp_path):
+    first = chopitup.SegmentCache(str(tmp_path), 1000)
+    second = chopitup.SegmentCache(str(tmp_path), 1000)
+    add_segment(first, "a", 10)
+    add_segment(second, "b", 10)
+    assert first.get("a") is not None
+    assert second.get("a") is None
+    first.save()
+    second.save()
+
+    cache = chopitup.SegmentCache(str(tmp_path), 1000)
+    assert set(cache.entries) == {"a", "b"}
+    assert cache.stats == {"hits": 1, "misses": 1, "bytes_saved": 10}
+
+
+def test_no_eviction_while_another_cache_is_in_use(tmp_path):
+    user = chopitup.SegmentCache(str(tmp_path), 15)
+    add_segment(user, "a", 10)
+    user.save()
+
+    cache = chopitup.SegmentCache(str(tmp_path), 15)
+    with user.in_use():
+        assert user.get("a") is not None
+        add_segment(cache, "b", 10)
+        cache.save(keep={"b"})
+        assert os.path.exists(user.path("a"))
+
+    cache.save(keep={"b"})
+    assert not os.path.exists(user.path("a"))
+    assert set(chopitup.SegmentCache(str(tmp_path), 15).entries) == {"b"}
@@ -0,0 +1,55 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for what the --serve request handling accepts
+
+import os
+import sys
+import types
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+def output_path(root, request):
+    handler = types.SimpleNamespace(server=types.SimpleNamespace(output_root=os.path.realpath(root)))
+    return chopitup.ChopItUpRequestHandler.output_path(handler, request, "output_video.mp4")
+
+
+def test_outputs_stay_under_the_output_root(tmp_path):
+    root = tmp_path / "root"
+    (root / "client").mkdir(parents=True)
+    root = os.path.realpath(root)
+
+    assert output_path(root, {}) == os.path.join(root, "output_video.mp4")
+    assert output_path(root, {"cwd": os.path.join(root, "client"), "output": "a.mp4"}) == os.path.join(root, "client", "a.mp4")
+    # a client working directory outside the root falls back to the root
+    assert output_path(root, {"cwd": str(tmp_path), "output": "a.mp4"}) == os.path.join(root, "a.mp4")
+
+    for output in ("/etc/passwd", "../a.mp4", "client/../../a.mp4"):
+        with pytest.raises(PermissionError):
+            output_path(root, {"output": output})
+
+    os.symlink(str(tmp_path), os.path.join(root, "out"))
+    with pytest.raises(PermissionError):
+        output_path(root, {"output": "out/a.mp4"})
+
+
+def test_labels_have_to_name_a_library(tmp_path, monkeypatch):
+    monkeypatch.setattr(chopitup, "data_dir", str(tmp_path))
+    (tmp_path / "tony_library.json").write_text('{"sources": []}')
+    pool = chopitup.LibraryPool()
+
+    assert pool.get("tony", "json").word_library == {"sources": []}
+    for label, library_format in (("../tony", "json"), ("linda", "json"), ("tony", "../json"), (["tony"], "json")):
+        with pytest.raises((ValueError, FileNotFoundError)):
+            pool.get(label, library_format)
+
+
+def test_remote_listening_needs_a_token():
+    assert chopitup.is_loopback("127.0.0.1")
+    assert chopitup.is_loopback("::1")
+    assert not chopitup.is_loopback("0.0.0.0")
+    assert not chopitup.is_loopback("")
+    assert chopitup.serve("0.0.0.0", 0) is False
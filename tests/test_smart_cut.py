@@ -0,0 +1,66 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for splitting segments into stream-copied and re-encoded parts for the smart cut assembler
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+KEYFRAMES = [0.0, 2.0, 4.0, 6.0, 8.0, 10.0]
+VIDEO = {"codec_type": "video", "codec_name": "h264", "profile": "High", "level": 40, "width": 1280, "height": 720,
+         "pix_fmt": "yuv420p", "r_frame_rate": "30/1", "time_base": "1/15360"}
+AUDIO = {"codec_type": "audio", "codec_name": "aac", "sample_rate": "48000", "channels": 2}
+
+
+def synthetic_index(tmp_path, **video):
+    """
+    A KeyframeIndex holding a made up probe of a media file, which get() returns without running ffprobe.
+    """
+    media = tmp_path / "a.mp4"
+    media.write_bytes(b"not really a video")
+    stat = os.stat(media)
+    index = chopitup.KeyframeIndex()
+    index.sources[str(media)] = {"keyframes": KEYFRAMES, "video": dict(VIDEO, **video), "audio": AUDIO,
+                                 "size": stat.st_size, "mtime": stat.st_mtime}
+    return index, str(media)
+
+
+def test_segment_on_keyframes_is_only_copied(tmp_path):
+    index, media = synthetic_index(tmp_path)
+    keyframes = index.get(media)["keyframes"]
+    assert not index.changed
+    assert chopitup.smart_cut_parts(keyframes, 2.0, 6.0) == [(2.0, 6.0, True)]
+    # edges shorter than SMART_CUT_MIN_PART aren't encoded on their own
+    assert chopitup.smart_cut_parts(keyframes, 1.98, 6.01) == [(2.0, 6.0, True)]
+
+
+def test_segment_over_several_gops_copies_the_middle(tmp_path):
+    index, media = synthetic_index(tmp_path)
+    keyframes = index.get(media)["keyframes"]
+    assert chopitup.smart_cut_parts(keyframes, 1.5, 7.25) == [(1.5, 2.0, False), (2.0, 6.0, True), (6.0, 7.25, False)]
+    # starting on a keyframe, only the tail is encoded
+    assert chopitup.smart_cut_parts(keyframes, 4.0, 9.5) == [(4.0, 8.0, True), (8.0, 9.5, False)]
+
+
+def test_segment_within_one_gop_is_encoded(tmp_path):
+    index, media = synthetic_index(tmp_path)
+    keyframes = index.get(media)["keyframes"]
+    assert chopitup.smart_cut_parts(keyframes, 2.5, 3.5) == [(2.5, 3.5, False)]
+    # only one keyframe inside, nothing to copy
+    assert chopitup.smart_cut_parts(keyframes, 3.0, 5.0) == [(3.0, 5.0, False)]
+    # after the last keyframe
+    assert chopitup.smart_cut_parts(keyframes, 10.5, 11.0) == [(10.5, 11.0, False)]
+
+
+def test_smart_cut_params_need_matching_sources(tmp_path):
+    index, media = synthetic_index(tmp_path)
+    entry = index.get(media)
+    assert chopitup.smart_cut_params([entry, entry]) == (1280, 720, "high", 40, "yuv420p", "30/1", "1/15360", "48000", 2)
+
+    other_level, _ = synthetic_index(tmp_path, level=31)
+    assert chopitup.smart_cut_params([entry, other_level.get(media)]) is None
+    # a profile libx264 can't encode the edges in
+    unsupported, _ = synthetic_index(tmp_path, profile="High 4:4:4 Intra")
+    assert chopitup.smart_cut_params([unsupported.get(media)]) is None
@@ -0,0 +1,39 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for splitting the output into chunks for the parallel assembler
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import chopitup
+
+
+def make_segments(durations):
+    segments, start = [], 0.0
+    for idx, duration in enumerate(durations):
+        segments.append({"src": idx % 3, "A": start, "B": start + duration, "id": idx})
+        start += duration + 1.0
+    return segments
+
+
+@pytest.mark.parametrize("durations", [[0.5] * 40, [0.2, 5.0, 0.3, 0.3, 12.0, 0.4, 0.4, 0.4, 1.0], [3.0], [0.0, 0.0, 0.0]])
+@pytest.mark.parametrize("jobs", [1, 2, 3, 8, 100])
+def test_every_segment_lands_in_one_chunk_in_order(durations, jobs):
+    segments = make_segments(durations)
+    chunks = chopitup.split_segments(segments, min(jobs, len(segments)))
+    assert [segment["id"] for chunk in chunks for segment in chunk] == list(range(len(segments)))
+    assert all(chunks)
+    assert 1 <= len(chunks) <= min(jobs, len(segments))
+
+
+def test_equal_segments_are_split_evenly():
+    chunks = chopitup.split_segments(make_segments([0.5] * 40), 4)
+    assert [len(chunk) for chunk in chunks] == [10, 10, 10, 10]
+
+
+@pytest.mark.parametrize("jobs", [0, 1, 4])
+def test_no_segments_make_no_chunks(jobs):
+    assert chopitup.split_segments([], jobs) == []
@@ -0,0 +1,106 @@
+# ChopItUp - (c) Hippy, 2023,  WTFPL
+# tests for the speech filter time mapping and the parallel window plan of video_to_transcript.py
+
+import os
+import sys
+import array
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+# needs vosk, moviepy and the other transcription dependencies
+video_to_transcript = pytest.importorskip("video_to_transcript")
+
+FRAME_BYTES = video_to_transcript.VAD_FRAME_BYTES
+FRAME_SECONDS = FRAME_BYTES / video_to_transcript.BYTES_PER_SECOND
+INF = float("inf")
+
+
+def make_frame(index, loud):
+    """
+    A 30ms frame that records its own index in its first two samples, loud or well below the threshold.
+    """
+    samples = array.array("h", [10000 if loud else 0] * (FRAME_BYTES // 2))
+    samples[0], samples[1] = index // 100, index % 100
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples.tobytes()
+
+
+def frame_index(frame):
+    samples = array.array("h", frame[:4])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples[0] * 100 + samples[1]
+
+
+def test_speech_filter_maps_recognizer_times_back_across_dropped_silence():
+    # (seconds, loud) stretches, with silences long enough to be dropped between the speech
+    stretches = [(2.0, False), (1.0, True), (3.0, False), (0.5, True), (2.0, False), (1.2, True), (1.5, False)]
+    frames = []
+    for seconds, loud in stretches:
+        frames.extend(make_frame(len(frames), loud) for _ in range(round(seconds / FRAME_SECONDS)))
+    audio = b"".join(frames)
+
+    speech_filter = video_to_transcript.SpeechFilter(padding=0.3)
+    fed = []
+    # odd sized reads, so frames are split across calls
+    for offset in range(0, len(audio), 4001):
+        fed.append(speech_filter.filter(audio[offset:offset + 4001]))
+    fed.append(speech_filter.flush())
+    fed = b"".join(fed)
+
+    assert len(fed) == speech_filter.fed_bytes < len(audio)
+    assert speech_filter.read_bytes == len(audio)
+    assert len(speech_filter.region_fed) == 3
+
+    for offset in range(0, len(fed), FRAME_BYTES):
+        start_time = offset / video_to_transcript.BYTES_PER_SECOND
+        real_start, real_end = speech_filter.real_time(start_time, start_time + 0.25)
+        assert real_start == pytest.approx(frame_index(fed[offset:offset + FRAME_BYTES]) * FRAME_SECONDS)
+        assert real_end - real_start == pytest.approx(0.25)
+
+
+def test_speech_filter_passes_speech_through_unchanged():
+    audio = b"".join(make_frame(idx, True) for idx in range(100))
+    speech_filter = video_to_transcript.SpeechFilter()
+    assert speech_filter.filter(audio) + speech_filter.flush() == audio
+    assert speech_filter.real_time(1.5, 1.75) == (1.5, 1.75)
+
+
+def test_plan_windows_without_overlap():
+    assert video_to_transcript.plan_windows(90.0, 3, 0.0) == [
+        (0.0, 30.0, -INF, 30.0), (30.0, 30.0, 30.0, 60.0), (60.0, 30.0, 60.0, INF)]
+
+
+def test_plan_windows_with_overlap():
+    assert video_to_transcript.plan_windows(90.0, 3, 10.0) == [
+        (0.0, 40.0, -INF, 30.0), (20.0, 50.0, 30.0, 60.0), (50.0, 40.0, 60.0, INF)]
+
+
+def test_plan_windows_clamps_short_windows_to_the_media():
+    # the overlap is longer than the windows, the first and last windows stop at the ends of the media
+    plan = video_to_transcript.plan_windows(10.0, 4, 5.0)
+    assert [(start, duration) for start, duration, _, _ in plan] == [(0.0, 7.5), (0.0, 10.0), (0.0, 10.0), (2.5, 7.5)]
+    # the keep ranges still cover the media exactly once
+    assert [(keep_from, keep_until) for _, _, keep_from, keep_until in plan] == [
+        (-INF, 2.5), (2.5, 5.0), (5.0, 7.5), (7.5, INF)]
+
+
+def test_merge_window_words_keeps_each_word_once():
+    plan = video_to_transcript.plan_windows(90.0, 3, 10.0)
+    # one word a second, each window recognizes its whole decode range, with slightly different times
+    window_words = []
+    for idx, (start, duration, _, _) in enumerate(plan):
+        shift = 0.02 * idx
+        window_words.append([(f"w{second}", second + shift, second + 0.5 + shift)
+                             for second in range(int(start), int(start + duration))])
+    merged = video_to_transcript.merge_window_words(plan, window_words)
+    assert [word for word, _, _ in merged] == [f"w{second}" for second in range(90)]
+    assert all(previous[1] < word[1] for previous, word in zip(merged, merged[1:]))
+
+    # a word straddling a boundary that both windows keep is only kept once
+    window_words = [[("a", 28.0, 28.5), ("x", 29.9, 30.0)], [("x", 29.95, 30.2), ("b", 31.0, 31.5)], []]
+    assert video_to_transcript.merge_window_words(plan, window_words) == [
+        ("a", 28.0, 28.5), ("x", 29.9, 30.0), ("b", 31.0, 31.5)]
@@ -12,12 +12,44 @@ import requests
 import tempfile
 import shutil
 import glob
+import time
+import math
+import array
+import bisect
+import argparse
+import warnings
+import multiprocessing
+from collections import deque
 from tqdm import tqdm
 from vosk import Model, KaldiRecognizer, SetLogLevel
 from moviepy.editor import VideoFileClip, AudioFileClip
 import subprocess
+import profiling
+
+try:
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        import audioop  # fast rms, gone in Python 3.13
+except ImportError:
+    audioop = None
 
 PROGRESS_PERCENTAGE = 0.85  # space on the terminal to use for status line
+DEFAULT_CHUNK_SIZE = 4000  # bytes of audio per recognizer call (4000 = 125ms)
+DEFAULT_PROGRESS_INTERVAL = 0.5  # seconds between progress line updates
+REC_WRITE_BUFFER = 1 << 16
+BYTES_PER_SECOND = 32000  # 16kHz 16 bit mono
+VAD_FRAME_BYTES = 960  # 30ms frames for the speech filter
+DEFAULT_VAD_THRESHOLD = -45.0  # dBFS, quieter frames count as silence
+DEFAULT_VAD_PADDING = 0.3  # seconds of audio kept either side of speech
+DEFAULT_CHECKPOINT_INTERVAL = 60.0  # seconds of audio between checkpoints
+CHECKPOINT_VERSION = 1
+REC_COMPLETE_MARKER = "# complete"  # last line of a finished .rec
+DEFAULT_WINDOW_OVERLAP = 10.0  # seconds recognized twice either side of a window boundary
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv")
+
+# the recognition model we require (has to be this one as it returns sample times)
+model_url = "https://alphacephei.com/vosk/models/vosk-model-en-us-aspire-0.2.zip"
+model_dir_name = "vosk-model-en-us-aspire-0.2"
 
 def get_terminal_width():
     return shutil.get_terminal_size().columns
@@ -54,6 +86,14 @@ def download_and_unzip_model(model_url, model_path, data_dir):
         print(f"Vosk model could not be found at {model_path} \nMaybe download or unzip failed, or a permissions or drive space issue?\n")
         sys.exit(1)
 
+def get_model_path(data_dir):
+    """
+    Path of the recognition model in data_dir, downloaded first if it isn't there yet.
+    """
+    model_path = os.path.join(data_dir, model_dir_name)
+    download_and_unzip_model(model_url, model_path, data_dir)
+    return model_path
+
 
 # def transcribe_audio(model_path, video_path, quiet=False):
 #     model = Model(model_path)
@@ -137,14 +177,175 @@ def get_media_duration(video_path):
 
 
 
+def frame_rms(frame):
+    if audioop is not None:
+        return audioop.rms(frame, 2)
+    samples = array.array("h", frame)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return math.sqrt(sum(sample * sample for sample in samples) / len(samples)) if samples else 0.0
+
+
+class SpeechFilter:
+    """
+    Energy based voice activity detection in front of the recognizer: frames quieter than
+    threshold_db are dropped, except for padding seconds before and after speech so word
+    edges aren't clipped. The offsets of the regions that are passed on are kept so the
+    recognizer's timestamps (which only count the audio it was fed) can be mapped back.
+    """
+
+    def __init__(self, threshold_db=DEFAULT_VAD_THRESHOLD, padding=DEFAULT_VAD_PADDING):
+        self.threshold = 32768 * 10 ** (threshold_db / 20)
+        self.pad_frames = max(1, int(padding * BYTES_PER_SECOND / VAD_FRAME_BYTES))
+        self.pending = b""
+        self.recent = deque(maxlen=self.pad_frames)  # silent frames held back as padding
+        self.hangover = 0   # frames still passed on after the last speech frame
+        self.read_bytes = 0
+        self.fed_bytes = 0
+        self.region_fed = []   # fed byte offset of each region start
+        self.region_real = []  # its byte offset in the media
+
+    def filter(self, data):
+        """
+        Take the next audio from ffmpeg, returns the audio to hand to the recognizer.
+        """
+        self.pending += data
+        usable = len(self.pending) - len(self.pending) % VAD_FRAME_BYTES
+        out = []
+        for offset in range(0, usable, VAD_FRAME_BYTES):
+            frame = self.pending[offset:offset + VAD_FRAME_BYTES]
+            self.read_bytes += VAD_FRAME_BYTES
+
+            if frame_rms(frame) >= self.threshold:
+                if self.hangover == 0:
+                    # speech starts, pass on the padding held back before it
+                    self.region_fed.append(self.fed_bytes)
+                    self.region_real.append(self.read_bytes - (len(self.recent) + 1) * VAD_FRAME_BYTES)
+                    out.extend(self.recent)
+                    self.fed_bytes += len(self.recent) * VAD_FRAME_BYTES
+                    self.recent.clear()
+                self.hangover = self.pad_frames
+            elif self.hangover > 0:
+                self.hangover -= 1
+            else:
+                self.recent.append(frame)
+                continue
+
+            out.append(frame)
+            self.fed_bytes += VAD_FRAME_BYTES
+
+        self.pending = self.pending[usable:]
+        return b"".join(out)
+
+    def flush(self):
+        """
+        The audio left over at the end of the stream, if it belongs to speech.
+        """
+        tail, self.pending = self.pending, b""
+        self.read_bytes += len(tail)
+        if self.hangover == 0:
+            return b""
+        self.fed_bytes += len(tail)
+        return tail
+
+    def real_time(self, start_time, end_time):
+        """
+        Map a word's recognizer times to media times, the word is kept in its start's region.
+        """
+        fed = start_time * BYTES_PER_SECOND
+        idx = bisect.bisect_right(self.region_fed, fed) - 1
+        if idx < 0:
+            return start_time, end_time
+        real_start = (self.region_real[idx] + fed - self.region_fed[idx]) / BYTES_PER_SECOND
+        return real_start, real_start + end_time - start_time
+
+    def summary(self):
+        return self.make_summary(self.read_bytes, self.fed_bytes, len(self.region_fed))
+
+    @staticmethod
+    def make_summary(read_bytes, fed_bytes, regions):
+        audio_seconds = read_bytes / BYTES_PER_SECOND
+        speech_seconds = fed_bytes / BYTES_PER_SECOND
+        return {
+            "regions": regions,
+            "speech_seconds": round(speech_seconds, 2),
+            "skipped_seconds": round(audio_seconds - speech_seconds, 2),
+            "skipped_percent": round(100.0 * (audio_seconds - speech_seconds) / audio_seconds, 1) if audio_seconds > 0 else 0.0,
+            # the recognizer's time is roughly proportional to the audio it is fed
+            "estimated_speedup": round(audio_seconds / speech_seconds, 2) if speech_seconds > 0 else 0.0,
+        }
+
+
+# a .rec is written as <name>.rec.part and renamed when it is complete, <name>.rec.ckpt records
+# how far into the media the .part file goes so a killed transcription can be resumed
+
+def rec_is_complete(rec_filename):
+    """
+    True if the .rec exists and ends with the completion marker.
+    """
+    if not os.path.exists(rec_filename):
+        return False
+    with open(rec_filename, "rb") as f:
+        f.seek(max(0, os.path.getsize(rec_filename) - 256))
+        lines = f.read().splitlines()
+    return bool(lines) and lines[-1].startswith(REC_COMPLETE_MARKER.encode())
+
+def read_checkpoint(checkpoint_filename, video_path, part_filename):
+    """
+    The checkpoint for video_path, or None if there is no usable one: it has to be for the
+    same media as the .part file, and the .part file has to hold everything it records.
+    """
+    if not os.path.exists(checkpoint_filename) or not os.path.exists(part_filename):
+        return None
+    try:
+        with open(checkpoint_filename, "r") as f:
+            checkpoint = json.load(f)
+    except ValueError:
+        return None
+    if checkpoint.get("version") != CHECKPOINT_VERSION or checkpoint.get("media") != video_path:
+        return None
+    with open(part_filename, "r", encoding="utf-8", errors="replace") as f:
+        if f.readline() != f"media={video_path}\n":
+            return None
+    if not 0 < checkpoint.get("rec_bytes", 0) <= os.path.getsize(part_filename):
+        return None
+    return checkpoint
+
+def write_checkpoint(checkpoint_filename, checkpoint):
+    with open(checkpoint_filename + ".tmp", "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(checkpoint_filename + ".tmp", checkpoint_filename)
+
 
 # transcribe audio from a video file
-def transcribe_audio(model_path, video_path, quiet=False):
-    model = Model(model_path)
+# pass an already loaded model to avoid loading it again for every file.
+# chunk_size is the number of bytes of 16kHz 16 bit mono audio handed to the recognizer at a
+# time, the progress line and partial result are redrawn at most every progress_interval seconds.
+# with vad, silence is filtered out by a SpeechFilter before it reaches the recognizer.
+# with windows > 1 the file is split up and recognized in parallel by transcribe_windows().
+# a checkpoint is saved after the first utterance that ends checkpoint_interval seconds of audio
+# after the last one, with resume a transcription carries on from its checkpoint.
+# returns the summary dict that is also printed (and appended to summary_path) as a JSON line
+def transcribe_audio(model_path, video_path, quiet=False, model=None,
+                     chunk_size=DEFAULT_CHUNK_SIZE, progress_interval=DEFAULT_PROGRESS_INTERVAL, summary_path=None,
+                     vad=False, vad_threshold=DEFAULT_VAD_THRESHOLD, vad_padding=DEFAULT_VAD_PADDING,
+                     checkpoint_interval=DEFAULT_CHECKPOINT_INTERVAL, resume=False,
+                     windows=1, window_overlap=DEFAULT_WINDOW_OVERLAP):
+    if windows > 1:
+        return transcribe_windows(model_path, video_path, windows, window_overlap, quiet=quiet, chunk_size=chunk_size,
+                                  summary_path=summary_path, vad=vad, vad_threshold=vad_threshold, vad_padding=vad_padding)
+
+    start_wall = time.monotonic()
+
+    if model is None:
+        with profiling.span("model.load"):
+            model = Model(model_path)
     rec = KaldiRecognizer(model, 16000)
     rec.SetWords(True)
 
     output_filename = os.path.splitext(video_path)[0] + ".rec"
+    part_filename = output_filename + ".part"
+    checkpoint_filename = output_filename + ".ckpt"
 
     total_duration = get_media_duration(video_path)
     if total_duration == 0:
@@ -152,57 +353,373 @@ def transcribe_audio(model_path, video_path, quiet=False):
         sys.exit(1)
 
     progress = 0
+    word_count = 0
+    next_progress_update = 0.0
+    timed = profiling.enabled  # the read and recognize timers, looked up once as they run per chunk
+    speech_filter = SpeechFilter(vad_threshold, vad_padding) if vad else None
+
+    start_offset = 0.0  # seconds into the media this run starts at
+    checkpoint = read_checkpoint(checkpoint_filename, video_path, part_filename) if resume else None
+    if checkpoint is None:
+        # starting over, a checkpoint left behind doesn't describe the new .part file
+        if os.path.exists(checkpoint_filename):
+            os.remove(checkpoint_filename)
+    else:
+        start_offset = checkpoint["audio_seconds"]
+        word_count = checkpoint["words"]
+        # drop anything written after the checkpoint, it is recognized again
+        with open(part_filename, "r+b") as f:
+            f.truncate(checkpoint["rec_bytes"])
+        print(f"Resuming {video_path} from {start_offset:.1f}s ({word_count} words)")
+    last_checkpoint = 0
 
     terminal_width = get_terminal_width()
     progress_line_length = int(terminal_width * PROGRESS_PERCENTAGE)
 
-    with open(output_filename, "w") as f:
-
-        f.write(f"media={video_path}\n") # add media file name as first line to the transcript
-
-        # convert whatever into audio                
-        with subprocess.Popen(["ffmpeg", "-loglevel", "quiet", "-i",
+    def write_words(f, results):
+        lines = []
+        for result in results.get("result", []):
+            start_time, end_time = result["start"], result["end"]
+            if speech_filter is not None:
+                start_time, end_time = speech_filter.real_time(start_time, end_time)
+            start_time += start_offset
+            end_time += start_offset
+            lines.append(f"{result['word']}\t{start_time:.2f}\t{end_time:.2f}\n")
+        f.write("".join(lines))
+        return len(lines)
+
+    with open(part_filename, "a" if start_offset else "w", buffering=REC_WRITE_BUFFER) as f:
+
+        if not start_offset:
+            f.write(f"media={video_path}\n") # add media file name as first line to the transcript
+
+        # convert whatever into audio, from the checkpoint on when resuming
+        seek = ["-ss", f"{start_offset:.3f}"] if start_offset else []
+        with subprocess.Popen(["ffmpeg", "-loglevel", "quiet"] + seek + ["-i",
                                video_path,
                                "-ar", "16000", "-ac", "1", "-f", "s16le", "-"],
                               stdout=subprocess.PIPE).stdout as stream:
 
             while True:
-                data = stream.read(4000)
+                if timed:
+                    read_start = time.perf_counter()
+                data = stream.read(chunk_size)
+                if timed:
+                    profiling.add_time("ffmpeg.decode", time.perf_counter() - read_start)
                 if len(data) == 0:
                     break
 
                 progress += len(data)
-                progress_seconds = progress / 32000
 
-                if not quiet:
-                    progress_percentage = 100.0 * progress_seconds / total_duration
-                    sys.stderr.write(f"\rProgress: {progress_percentage:.2f}%")
+                if speech_filter is not None:
+                    data = speech_filter.filter(data)
+
+                if timed:
+                    recognize_start = time.perf_counter()
+                accepted = data and rec.AcceptWaveform(data)
+                if timed:
+                    profiling.add_time("vosk.recognize", time.perf_counter() - recognize_start)
+
+                if accepted:
+                    word_count += write_words(f, json.loads(rec.Result()))
+
+                    # an utterance just ended, so everything read so far is in the .part file
+                    consumed = speech_filter.read_bytes if speech_filter is not None else progress
+                    if checkpoint_interval > 0 and consumed - last_checkpoint >= checkpoint_interval * BYTES_PER_SECOND:
+                        f.flush()
+                        os.fsync(f.fileno())
+                        write_checkpoint(checkpoint_filename, {
+                            "version": CHECKPOINT_VERSION,
+                            "media": video_path,
+                            "audio_seconds": start_offset + consumed / BYTES_PER_SECOND,
+                            "rec_bytes": os.fstat(f.fileno()).st_size,
+                            "words": word_count,
+                        })
+                        last_checkpoint = consumed
+
+                if not quiet and time.monotonic() >= next_progress_update:
+                    next_progress_update = time.monotonic() + progress_interval
+
+                    progress_percentage = 100.0 * (start_offset + progress / BYTES_PER_SECOND) / total_duration
+                    status = f"\rProgress: {progress_percentage:.2f}%"
+
+                    partial = json.loads(rec.PartialResult()).get("partial", "")
+                    partial_display = partial[-(progress_line_length - 20):]
+                    if len(partial) > progress_line_length - 20:
+                        partial_display = "..." + partial_display
+
+                    # pad to overwrite a longer previous line
+                    sys.stderr.write(f"{status} - {partial_display}".ljust(progress_line_length))
                     sys.stderr.flush()
 
-                if rec.AcceptWaveform(data):
-                    results = json.loads(rec.Result())
-                    if "result" in results:
-                        for result in results["result"]:
-                            start_time = result["start"]
-                            end_time = result["end"]
-                            word = result["word"]
-                            f.write(f"{word}\t{start_time:.2f}\t{end_time:.2f}\n")
-
-                if not quiet:
-                    partial_result = json.loads(rec.PartialResult())
-                    if "partial" in partial_result:
-                        partial = partial_result["partial"]
-                        partial_display = partial[-(progress_line_length - 20):]
-                        if len(partial) > progress_line_length - 20:
-                            partial_display = "..." + partial_display
-                        sys.stderr.write(f" - {partial_display}")
-                        sys.stderr.flush()
+        if speech_filter is not None:
+            tail = speech_filter.flush()
+            if tail and rec.AcceptWaveform(tail):
+                word_count += write_words(f, json.loads(rec.Result()))
+
+        # words of the last utterance are only returned by the final result
+        word_count += write_words(f, json.loads(rec.FinalResult()))
+
+        f.write(f"{REC_COMPLETE_MARKER} words={word_count}\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    # the .rec only shows up once it is complete
+    os.replace(part_filename, output_filename)
+    if os.path.exists(checkpoint_filename):
+        os.remove(checkpoint_filename)
 
     if not quiet:
         sys.stderr.write("\n")
         sys.stderr.flush()
 
     print(f"Transcription saved to {output_filename}")
+    profiling.count("bytes.decoded", progress)
+    profiling.count("words", word_count)
+
+    audio_seconds = progress / BYTES_PER_SECOND
+    wall_seconds = time.monotonic() - start_wall
+    summary = {
+        "event": "transcription_summary",
+        "media": video_path,
+        "rec": output_filename,
+        "model": os.path.basename(model_path),
+        "chunk_size": chunk_size,
+        "audio_seconds": round(audio_seconds, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "realtime_factor": round(audio_seconds / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "words": word_count,
+        "words_per_second": round(word_count / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+    if start_offset:
+        summary["resumed_from"] = round(start_offset, 2)
+    if speech_filter is not None:
+        summary["vad"] = speech_filter.summary()
+    save_summary(summary, summary_path)
+
+    return summary
+
+
+def save_summary(summary, summary_path=None):
+    """
+    Print a file's summary as a JSON line, and append it to summary_path.
+    """
+    if "vad" in summary:
+        vad = summary["vad"]
+        print(f"Speech filter skipped {vad['skipped_seconds']:.1f}s of {summary['audio_seconds']:.1f}s ({vad['skipped_percent']}%), "
+              f"estimated speedup x{vad['estimated_speedup']}")
+    print(json.dumps(summary))
+    if summary_path:
+        with open(summary_path, "a") as summary_file:
+            summary_file.write(json.dumps(summary) + "\n")
+
+
+def format_summary(video_path, audio_seconds, wall_seconds):
+    realtime_factor = audio_seconds / wall_seconds if wall_seconds > 0 else 0.0
+    return f"{video_path}: audio {audio_seconds:.1f}s, wall {wall_seconds:.1f}s, realtime x{realtime_factor:.2f}"
+
+
+# ------------------------------
+# worker pool for -all -j N, each worker process loads the model once and keeps it
+
+worker_model = None
+
+def init_worker(model_path):
+    global worker_model
+    SetLogLevel(-1)
+    worker_model = Model(model_path)
+
+def transcribe_worker(args):
+    model_path, video_path, options = args
+    try:
+        summary = transcribe_audio(model_path, video_path, quiet=True, model=worker_model, **options)
+        return video_path, summary["audio_seconds"], summary["wall_seconds"], None
+    except (Exception, SystemExit) as e:
+        # transcribe_audio calls sys.exit() on bad media, don't let that take the worker down
+        return video_path, 0.0, 0.0, str(e) or type(e).__name__
+
+# options are passed through to transcribe_audio()
+def transcribe_all(model_path, video_files, jobs, options):
+    start_wall = time.monotonic()
+    total_audio = 0.0
+    failed = 0
+
+    if jobs <= 1:
+        with profiling.span("model.load"):
+            model = Model(model_path)
+        for video_path in video_files:
+            print(f"Processing {video_path}")
+            with profiling.span("transcribe", media=video_path):
+                summary = transcribe_audio(model_path, video_path, model=model, **options)
+            total_audio += summary["audio_seconds"]
+            print(format_summary(video_path, summary["audio_seconds"], summary["wall_seconds"]))
+    else:
+        jobs = min(jobs, len(video_files))
+        print(f"Processing {len(video_files)} files with {jobs} workers")
+        tasks = [(model_path, video_path, options) for video_path in video_files]
+        with multiprocessing.Pool(jobs, initializer=init_worker, initargs=(model_path,)) as pool:
+            # chunksize=1 so idle workers pull the next video from the queue as soon as they finish
+            for video_path, audio_seconds, wall_seconds, error in pool.imap_unordered(transcribe_worker, tasks, chunksize=1):
+                if error:
+                    failed += 1
+                    print(f"{video_path}: failed - {error}")
+                else:
+                    total_audio += audio_seconds
+                    print(format_summary(video_path, audio_seconds, wall_seconds))
+
+    print(format_summary(f"Total ({len(video_files) - failed} files)", total_audio, time.monotonic() - start_wall))
+
+
+# ------------------------------
+# parallel windows within one long file: the media is cut into windows that overlap their
+# neighbours by window_overlap seconds on each side, each window is recognized by a worker
+# process holding its own model, and every window keeps the words whose middle falls between
+# the overlap midpoints (the nominal window boundaries), so the overlap gives the recognizer
+# context at the cut without producing words twice.
+
+def plan_windows(total_duration, windows, overlap):
+    """
+    Returns [(decode start, decode duration, keep from, keep until), ...] in time order.
+    """
+    bounds = [total_duration * idx / windows for idx in range(windows + 1)]
+    plan = []
+    for idx in range(windows):
+        start = max(0.0, bounds[idx] - overlap)
+        end = min(total_duration, bounds[idx + 1] + overlap)
+        keep_until = bounds[idx + 1] if idx < windows - 1 else float("inf")
+        plan.append((start, end - start, bounds[idx] if idx > 0 else float("-inf"), keep_until))
+    return plan
+
+def recognize_window(task):
+    """
+    Worker for transcribe_windows(): recognize one window, returns
+    (window index, [(word, start, end), ...] in media time, bytes read, bytes recognized, speech regions).
+    """
+    idx, video_path, start, duration, chunk_size, vad_settings = task
+    rec = KaldiRecognizer(worker_model, 16000)
+    rec.SetWords(True)
+    speech_filter = SpeechFilter(*vad_settings) if vad_settings else None
+    words = []
+
+    def add_words(results):
+        for result in results.get("result", []):
+            start_time, end_time = result["start"], result["end"]
+            if speech_filter is not None:
+                start_time, end_time = speech_filter.real_time(start_time, end_time)
+            words.append((result["word"], start + start_time, start + end_time))
+
+    read_bytes = 0
+    with subprocess.Popen(["ffmpeg", "-loglevel", "quiet", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i",
+                           video_path,
+                           "-ar", "16000", "-ac", "1", "-f", "s16le", "-"],
+                          stdout=subprocess.PIPE).stdout as stream:
+        while True:
+            data = stream.read(chunk_size)
+            if len(data) == 0:
+                break
+            read_bytes += len(data)
+            if speech_filter is not None:
+                data = speech_filter.filter(data)
+            if data and rec.AcceptWaveform(data):
+                add_words(json.loads(rec.Result()))
+
+    if speech_filter is not None:
+        tail = speech_filter.flush()
+        if tail and rec.AcceptWaveform(tail):
+            add_words(json.loads(rec.Result()))
+    add_words(json.loads(rec.FinalResult()))
+
+    if speech_filter is None:
+        return idx, words, read_bytes, read_bytes, 0
+    return idx, words, speech_filter.read_bytes, speech_filter.fed_bytes, len(speech_filter.region_fed)
+
+def merge_window_words(plan, window_words):
+    """
+    Join the words of the windows into one time ordered list, each window contributing the words
+    whose middle is in its keep range. A word recognized on both sides of a boundary (same word,
+    overlapping times) is only kept once.
+    """
+    merged = []
+    for (_, _, keep_from, keep_until), words in zip(plan, window_words):
+        for word, start_time, end_time in words:
+            if not keep_from <= (start_time + end_time) / 2 < keep_until:
+                continue
+            if merged and merged[-1][0] == word and start_time < merged[-1][2]:
+                continue
+            merged.append((word, start_time, end_time))
+    return merged
+
+def transcribe_windows(model_path, video_path, windows, overlap=DEFAULT_WINDOW_OVERLAP, quiet=False,
+                       chunk_size=DEFAULT_CHUNK_SIZE, summary_path=None,
+                       vad=False, vad_threshold=DEFAULT_VAD_THRESHOLD, vad_padding=DEFAULT_VAD_PADDING):
+    """
+    transcribe_audio() for one file split into windows recognized by a pool of worker processes.
+    Writes the same .rec (via .part and rename) and returns the same summary.
+    """
+    start_wall = time.monotonic()
+    output_filename = os.path.splitext(video_path)[0] + ".rec"
+    part_filename = output_filename + ".part"
+
+    total_duration = get_media_duration(video_path)
+    if total_duration == 0:
+        print("Error getting input media duration")
+        sys.exit(1)
+
+    if overlap < 0:
+        raise ValueError(f"Window overlap can't be negative: {overlap}")
+    # windows much shorter than the overlap would mostly recognize audio twice, without an
+    # overlap the windows are simply cut end to end
+    if overlap > 0:
+        windows = max(1, min(windows, int(total_duration // (4 * overlap)) or 1))
+    plan = plan_windows(total_duration, windows, overlap)
+    vad_settings = (vad_threshold, vad_padding) if vad else None
+    tasks = [(idx, video_path, start, duration, chunk_size, vad_settings) for idx, (start, duration, _, _) in enumerate(plan)]
+
+    window_words = [None] * windows
+    read_bytes = fed_bytes = regions = 0
+    with multiprocessing.Pool(windows, initializer=init_worker, initargs=(model_path,)) as pool:
+        for idx, words, window_read, window_fed, window_regions in pool.imap_unordered(recognize_window, tasks):
+            window_words[idx] = words
+            read_bytes += window_read
+            fed_bytes += window_fed
+            regions += window_regions
+            if not quiet:
+                print(f"Window {idx + 1}/{windows} done ({plan[idx][0]:.1f}s-{plan[idx][0] + plan[idx][1]:.1f}s, {len(words)} words)")
+
+    words = merge_window_words(plan, window_words)
+    with open(part_filename, "w", buffering=REC_WRITE_BUFFER) as f:
+        f.write(f"media={video_path}\n")
+        f.write("".join(f"{word}\t{start_time:.2f}\t{end_time:.2f}\n" for word, start_time, end_time in words))
+        f.write(f"{REC_COMPLETE_MARKER} words={len(words)}\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(part_filename, output_filename)
+
+    print(f"Transcription saved to {output_filename}")
+
+    # the audio of the file, the overlaps are extra work rather than extra audio
+    audio_seconds = total_duration
+    wall_seconds = time.monotonic() - start_wall
+    summary = {
+        "event": "transcription_summary",
+        "media": video_path,
+        "rec": output_filename,
+        "model": os.path.basename(model_path),
+        "chunk_size": chunk_size,
+        "windows": windows,
+        "window_overlap": overlap,
+        "audio_seconds": round(audio_seconds, 2),
+        "decoded_seconds": round(read_bytes / BYTES_PER_SECOND, 2),
+        "wall_seconds": round(wall_seconds, 2),
+        "realtime_factor": round(audio_seconds / wall_seconds, 3) if wall_seconds > 0 else 0.0,
+        "words": len(words),
+        "words_per_second": round(len(words) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+    if vad:
+        summary["vad"] = SpeechFilter.make_summary(read_bytes, fed_bytes, regions)
+    save_summary(summary, summary_path)
+
+    return summary
 
 
 def main(argv):
@@ -213,38 +730,87 @@ def main(argv):
         same name and in the same folder as the input video with '.rec' extension.  Intended for use
         with the creator.py script, and part of the ChopItUp tool kit. 
 
-        Usage: video_to_transcript.py -all <directory_path> OR video_to_transcript.py <video_path>
+        Usage: video_to_transcript.py [-j N] -all <directory_path> OR video_to_transcript.py <video_path>
         """)
         sys.exit(1)
 
-    if argv[0] == "-all":
-        directory_path = os.path.abspath(argv[1])
+    parser = argparse.ArgumentParser(description="ChopItUp speech recognition to .rec transcripts")
+    parser.add_argument("video_path", nargs="?", help="Video file to transcribe")
+    parser.add_argument("-all", metavar="DIR", dest="all_dir", help="Transcribe all video files in the directory")
+    parser.add_argument("-j", metavar="N", dest="jobs", type=int, default=1, help="Number of worker processes for -all (default: 1)")
+    parser.add_argument("--chunk-size", metavar="BYTES", type=int, default=DEFAULT_CHUNK_SIZE, help=f"Bytes of 16kHz mono audio per recognizer call, a positive even number (default: {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("--progress-interval", metavar="SECONDS", type=float, default=DEFAULT_PROGRESS_INTERVAL, help=f"Seconds between progress line updates (default: {DEFAULT_PROGRESS_INTERVAL})")
+    parser.add_argument("--summary-file", metavar="FILE", help="Append each file's JSON throughput summary to FILE")
+    parser.add_argument("--resume", action="store_true", help="Carry on interrupted transcriptions from their checkpoint, and skip files whose .rec is complete")
+    parser.add_argument("--checkpoint-interval", metavar="SECONDS", type=float, default=DEFAULT_CHECKPOINT_INTERVAL, help=f"Seconds of audio between checkpoints, 0 to disable (default: {DEFAULT_CHECKPOINT_INTERVAL})")
+    parser.add_argument("--windows", metavar="N", type=int, default=1, help="Split a single file into N overlapping time windows recognized in parallel processes (default: 1)")
+    parser.add_argument("--window-overlap", metavar="SECONDS", type=float, default=DEFAULT_WINDOW_OVERLAP, help=f"Audio recognized by both windows either side of a boundary, 0 for none (default: {DEFAULT_WINDOW_OVERLAP})")
+    parser.add_argument("--vad", action="store_true", help="Skip silence before speech recognition (energy based voice activity detection)")
+    parser.add_argument("--vad-threshold", metavar="DB", type=float, default=DEFAULT_VAD_THRESHOLD, help=f"Level in dBFS below which audio counts as silence for --vad (default: {DEFAULT_VAD_THRESHOLD})")
+    parser.add_argument("--vad-padding", metavar="SECONDS", type=float, default=DEFAULT_VAD_PADDING, help=f"Audio kept before and after speech for --vad (default: {DEFAULT_VAD_PADDING})")
+    parser.add_argument("--profile", metavar="FILE", help="Record time spent loading the model, decoding with ffmpeg and recognizing, and write it to FILE on exit (worker processes of -j and --windows aren't included)")
+    parser.add_argument("--profile-format", choices=["json", "chrome"], default="json", help="--profile output, 'chrome' is the trace event format read by chrome://tracing and Perfetto (default: json)")
+    args = parser.parse_args(argv)
+
+    if args.chunk_size <= 0 or args.chunk_size % 2:
+        parser.error("--chunk-size has to be a positive, even number of bytes (whole 16 bit samples)")
+    if args.window_overlap < 0:
+        parser.error("--window-overlap can't be negative")
+
+    if args.profile:
+        profiling.enable(args.profile, args.profile_format)
+
+    options = {
+        "chunk_size": args.chunk_size,
+        "progress_interval": args.progress_interval,
+        "summary_path": args.summary_file,
+        "vad": args.vad,
+        "vad_threshold": args.vad_threshold,
+        "vad_padding": args.vad_padding,
+        "checkpoint_interval": args.checkpoint_interval,
+        "resume": args.resume,
+    }
+
+    if args.all_dir:
+        directory_path = os.path.abspath(args.all_dir)
 
         if not os.path.isdir(directory_path):
             print(f"{directory_path} is not a valid directory.")
             sys.exit(1)
 
-        video_extensions = ["*.mp4", "*.avi", "*.mov", "*.mkv", "*.flv", "*.wmv"]
         video_files = []
 
-        for ext in video_extensions:
-            video_files.extend(glob.glob(os.path.join(directory_path, ext)))
+        for ext in VIDEO_EXTENSIONS:
+            video_files.extend(glob.glob(os.path.join(directory_path, "*" + ext)))
 
         if not video_files:
             print(f"No video files found in {directory_path}")
             sys.exit(1)
 
-        for video_path in video_files:
-            print(f"Processing {video_path}")
-            transcribe_audio(model_path, video_path)
-    else:
-        video_path = os.path.abspath(argv[0])
+        if args.resume:
+            remaining = [video_path for video_path in video_files if not rec_is_complete(os.path.splitext(video_path)[0] + ".rec")]
+            print(f"Skipping {len(video_files) - len(remaining)} files with a complete .rec")
+            video_files = remaining
+            if not video_files:
+                sys.exit(0)
+
+        if args.windows > 1:
+            print("--windows is for single files, -all runs files in parallel with -j instead")
+        transcribe_all(model_path, video_files, args.jobs, options)
+    elif args.video_path:
+        video_path = os.path.abspath(args.video_path)
 
         if not os.path.isfile(video_path):
             print(f"{video_path} is not a valid file.")
             sys.exit(1)
 
-        transcribe_audio(model_path, video_path)
+        if args.windows > 1 and args.resume:
+            print("--resume has no effect with --windows, the file is transcribed again")
+        with profiling.span("transcribe", media=video_path):
+            transcribe_audio(model_path, video_path, windows=args.windows, window_overlap=args.window_overlap, **options)
+    else:
+        parser.print_help()
+        sys.exit(1)
 
 if __name__ == "__main__":
 
@@ -252,12 +818,7 @@ if __name__ == "__main__":
     data_dir = appdirs.user_data_dir(app_name)
     os.makedirs(data_dir, exist_ok=True)
 
-    # the recognition model we require (has to be this one as it returns sample times)
-    model_url = "https://alphacephei.com/vosk/models/vosk-model-en-us-aspire-0.2.zip"
-    model_dir_name = "vosk-model-en-us-aspire-0.2"
-
-    model_path = os.path.join(data_dir, model_dir_name)
-    download_and_unzip_model(model_url, model_path, data_dir)
+    model_path = get_model_path(data_dir)
 
     SetLogLevel(-1)
 